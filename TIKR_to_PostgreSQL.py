@@ -1,181 +1,15 @@
-import requests
-import json
-from seleniumwire import webdriver
-from webdriver_manager.firefox import GeckoDriverManager
-from selenium.webdriver.common.by import By
-from selenium.webdriver.firefox.options import Options as FirefoxOptions
-from selenium.webdriver.firefox.service import Service as FirefoxService
-import time
-import keys
-import pandas as pd
-import datetime
+import metrics
+import tikr_parser
+import tikr_async
 import os
 import psycopg2
-import random
-
-from config import TIKR_ACCOUNT_USERNAME, TIKR_ACCOUNT_PASSWORD
-
-class TIKR:
-    def __init__(self):
-        self.username = TIKR_ACCOUNT_USERNAME
-        self.password = TIKR_ACCOUNT_PASSWORD
-        self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:108.0) Gecko/20100101 Firefox/108.0',
-            'Accept': 'application/json, text/plain, */*',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Content-Type': 'application/json',
-            'Origin': 'https://app.tikr.com',
-            'Connection': 'keep-alive',
-            'Referer': 'https://app.tikr.com/',
-            'Sec-Fetch-Dest': 'empty',
-            'Sec-Fetch-Mode': 'cors',
-            'Sec-Fetch-Site': 'cross-site',
-            'Pragma': 'no-cache',
-            'Cache-Control': 'no-cache',
-            'TE': 'trailers'
-        }
-        self.column_names = keys.keys
-        self.statements = keys.statements
-        self.content = {s['statement']: [] for s in self.statements}
-        if os.path.isfile('token.tmp'):
-            with open('token.tmp', 'r') as f:
-                self.ACCESS_TOKEN = f.read()
-        else:
-            self.ACCESS_TOKEN = ''
-
-    def getAccessToken(self):
-        firefox_options = FirefoxOptions()
-        # firefox_options.add_argument("--headless")  # Disabled for debugging
-        user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:108.0) Gecko/20100101 Firefox/108.0'
-        firefox_options.set_preference("general.useragent.override", user_agent)
-        firefox_options.add_argument('window-size=1920x1080')
-        s = FirefoxService(GeckoDriverManager().install())
-        browser = webdriver.Firefox(service=s, options=firefox_options)
-        browser.get('https://app.tikr.com/login')
-        browser.find_element(By.XPATH, '//input[@type="email"]').send_keys(self.username)
-        browser.find_element(By.XPATH, '//input[@type="password"]').send_keys(self.password)
-        browser.find_element(By.XPATH, '//button/span').click()
-        while 'Welcome to TIKR' not in browser.page_source:
-            time.sleep(5)
-        browser.get('https://app.tikr.com/screener?sid=1')
-        time.sleep(2)
-        browser.find_element(By.XPATH, '//button/span[contains(text(), "Fetch Screen")]/..').click()
-        time.sleep(5)
-        try:
-            for request in browser.requests:
-                if 'amazonaws.com/prod/fs' in request.url and request.method == 'POST':
-                    response = json.loads(request.body)
-                    print('[ * ] Successfully fetched access token')
-                    self.ACCESS_TOKEN = response['auth']
-                    with open('token.tmp', 'w') as f:
-                        f.write(self.ACCESS_TOKEN)
-        except Exception as err:
-            print(err)
-        browser.close()
-
-    def getFinancials(self, tid, cid):
-        url = "https://oljizlzlsa.execute-api.us-east-1.amazonaws.com/prod/fin"
-        while True:
-            payload = json.dumps({
-                "auth": self.ACCESS_TOKEN,
-                "tid": tid,
-                "cid": cid,
-                "p": "1",
-                "repid": 1,
-                "v": "v1"
-            })
-            response = requests.request("POST", url, headers=self.headers, data=payload).json()
-            if 'dates' not in response:
-                print('[ + ] Generating Access Token...')
-                scraper.getAccessToken()
-            else:
-                break
-
-        for fiscalyear in response['dates']:
-            fiscal_year_data = list(filter(lambda x: x['financialperiodid'] == fiscalyear['financialperiodid'], response['data']))
-            year_data = {s['statement']: {} for s in self.statements}
-            for statement in self.statements:
-                ACCESS_DENIED = 0
-                data = year_data[statement['statement']]
-                data['year'] = fiscalyear['calendaryear']
-                for column in statement['keys']:
-                    # SPECIAL CASES
-                    if column == 'Free Cash Flow':
-                        cash_from_ops = list(filter(lambda x: x['dataitemid'] == 2006, fiscal_year_data))
-                        capital_expen = list(filter(lambda x: x['dataitemid'] == 2021, fiscal_year_data))
-                        if cash_from_ops and capital_expen:
-                            data[column] = float(cash_from_ops[0]['dataitemvalue']) + float(capital_expen[0]['dataitemvalue'])
-                        continue
-                    elif column == '% Free Cash Flow Margins' and 'Free Cash Flow' in data:
-                        FCF = data['Free Cash Flow']
-                        revenue = list(filter(lambda x: x['dataitemid'] == self.statements[0]['keys']['Revenues'], fiscal_year_data))
-                        if revenue:
-                            data[column] = (float(FCF) / float(revenue[0]['dataitemvalue'])) * 100
-                        continue
-                    # GENERAL CASE
-                    value = list(filter(lambda x: x['dataitemid'] == statement['keys'][column], fiscal_year_data))
-                    if value:
-                        if value[0]['dataitemvalue'] == '1.11':
-                            ACCESS_DENIED += 1
-                            data[column] = ''
-                        else:
-                            if column in ['Income Tax Expense']:
-                                data[column] = float(value[0]['dataitemvalue']) * -1
-                            else:
-                                data[column] = float(value[0]['dataitemvalue'])
-                    else:
-                        data[column] = ''
-                if ACCESS_DENIED > 10: continue
-                self.content[statement['statement']].append(year_data[statement['statement']])
-
-        for statement in self.statements:
-            for idx, fiscalyear in enumerate(self.content[statement['statement']][:-1]):
-                for column in fiscalyear:
-                    if 'YoY' in column:
-                        try:
-                            if self.content[statement['statement']][idx - 1][column.replace(' YoY', '')]:
-                                if not column.replace(' YoY', '') not in fiscalyear or fiscalyear[column.replace(' YoY', '')] or not self.content[statement['statement']][idx - 1][column.replace(' YoY', '')]: continue
-                                current_value = float(fiscalyear[column.replace(' YoY', '')])
-                                old_value = float(self.content[statement['statement']][idx - 1][column.replace(' YoY', '')])
-                                if old_value and old_value != 0:
-                                    fiscalyear[column] = round(abs(100 - (current_value / old_value) * 100), 2)
-                        except:
-                            pass
-    
-    def find_company_info(self, ticker):
-        headers = self.headers.copy()
-        headers['content-type'] = 'application/x-www-form-urlencoded'
-        data = '{"params":"query=' + ticker + '&distinct=2"}'
-        response = requests.post('https://tjpay1dyt8-3.algolianet.com/1/indexes/tikr-feb/query?x-algolia-agent=Algolia%20for%20JavaScript%20(3.35.1)%3B%20Browser%20(lite)&x-algolia-application-id=TJPAY1DYT8&x-algolia-api-key=d88ea2aa3c22293c96736f5ceb5bab4e', headers=headers, data=data)
-        
-        if response.json()['hits']:
-            tid = response.json()['hits'][0]['tradingitemid']
-            cid = response.json()['hits'][0]['companyid']
-            return tid, cid
-        else:
-            return None, None
-
-    def export(self, filename):
-        with pd.ExcelWriter(filename, engine='xlsxwriter') as writer:
-            for statement in self.statements:
-                statement = statement['statement']
-                if not self.content[statement]: continue
-                columns = list(self.content[statement][0].keys())
-                years = [x['year'] for x in self.content[statement]]
-                years[-1] = 'LTM'
-                df = pd.DataFrame(self.content[statement], columns=columns, index=years)
-                df = df.drop(columns='year')
-                df.T.to_excel(writer, sheet_name=statement)
-                
-                # FIX SHEET FORMAT
-                worksheet = writer.sheets[statement]
-                worksheet.write('A1', filename.split('_')[0])
-                for idx, col in enumerate(df):
-                    if idx == 0:
-                        worksheet.set_column(idx, idx, 45)
-                    else:
-                        worksheet.set_column(idx, idx, 15)
+import asyncio
+import argparse
+
+from financials_writer import merge_financials, refresh_snapshot
+from tikr_client import TIKR
+
+REFRESH_DAYS = int(os.getenv('TIKR_REFRESH_DAYS', 7))
 
 # Add DB connection function
 
@@ -193,51 +27,142 @@ def get_symbols_from_db(conn):
         cur.execute("SELECT symbol FROM companies")
         return [row[0] for row in cur.fetchall()]
 
+def get_stale_symbols(conn, symbols, refresh_days=REFRESH_DAYS):
+    """Symbols never scraped, or last scraped more than refresh_days ago."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT s.symbol
+            FROM unnest(%s::text[]) AS s(symbol)
+            LEFT JOIN scrape_ledger l ON l.symbol = s.symbol
+            WHERE l.fetched_at IS NULL OR l.fetched_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+            """,
+            (list(symbols), refresh_days)
+        )
+        stale = {row[0] for row in cur.fetchall()}
+    return [symbol for symbol in symbols if symbol in stale]
+
+def get_fingerprints(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT symbol, fingerprint FROM scrape_ledger")
+        return dict(cur.fetchall())
+
+def update_ledger(conn, symbol, tid, cid, responses):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO scrape_ledger (symbol, tid, cid, fetched_at, latest_period_id, fingerprint)
+            VALUES (%s, %s, %s, CURRENT_TIMESTAMP, %s, %s)
+            ON CONFLICT (symbol) DO UPDATE SET
+                tid = EXCLUDED.tid,
+                cid = EXCLUDED.cid,
+                fetched_at = EXCLUDED.fetched_at,
+                latest_period_id = EXCLUDED.latest_period_id,
+                fingerprint = EXCLUDED.fingerprint
+            """,
+            (symbol, tid, cid, tikr_parser.latest_period(responses), tikr_parser.fingerprint(responses))
+        )
+    conn.commit()
+
+COPY_BATCH_SIZE = int(os.getenv('TIKR_COPY_BATCH_SIZE', 50))  # companies per transaction when loading from cache
+
+def financial_rows(symbol, scraper, ids):
+    """Yield one financials row tuple per cell of the company `scraper` holds.
+
+    `ids` is the {(statement, key): (statement_id, metric_id)} map from metrics.metric_ids.
+    """
+    for statement, fiscal_year, fiscal_period, key, value in scraper.records():
+        statement_id, metric_id = ids[statement, key]
+        yield symbol, statement_id, metric_id, fiscal_year, fiscal_period, value, 'USD'
+
+def store_company(conn, symbol, tid, cid, scraper, previous_fingerprint):
+    """Write a freshly fetched company unless its response is unchanged, then update the ledger.
+
+    The financials rows and the ledger entry are committed in one transaction.
+    """
+    if previous_fingerprint == tikr_parser.fingerprint(scraper.responses):
+        print(f'[ . ] No changes for {symbol} since the last scrape.')
+    else:
+        _, changed = merge_financials(conn, financial_rows(symbol, scraper, metrics.metric_ids(conn)))
+        if changed:
+            refresh_snapshot(conn, [symbol])
+        print(f'[ + ] Updated {changed} financials cells for {symbol} in database.')
+    update_ledger(conn, symbol, tid, cid, scraper.responses)
+
+async def scrape_symbols(conn, symbols, full=False):
+    if not full:
+        stale = get_stale_symbols(conn, symbols)
+        print(f'[ . ] {len(symbols) - len(stale)} symbols scraped within the last {REFRESH_DAYS} days, skipping them.')
+        symbols = stale
+    fingerprints = get_fingerprints(conn)
+    # Resolve the whole list up front with batched Algolia queries
+    resolved = TIKR().find_companies(symbols)
+    companies = []
+    for symbol in symbols:
+        tid, cid = resolved[symbol]
+        if not (tid and cid):
+            print(f'[ - ] [Error]: Could not find company for {symbol}')
+            continue
+        companies.append((symbol, tid, cid))
+    # Each worker still waits 40-80 seconds between its symbols
+    # Cached responses younger than the refresh interval are as good as a new fetch
+    factory = lambda: TIKR(max_cache_age=REFRESH_DAYS * 86400)
+    async for symbol, tid, cid, scraper in tikr_async.stream_financials(companies, factory, delay=(40, 80)):
+        if scraper is None:
+            continue
+        print(f'[ . ] Found company: {symbol} [Trading ID: {tid}] [Company ID: {cid}]')
+        store_company(conn, symbol, tid, cid, scraper, fingerprints.get(symbol))
+
+def insert_from_cache(conn, batch_size=COPY_BATCH_SIZE):
+    # Rebuild the financials table from cached responses without any network calls,
+    # merging and committing one batch of cached responses at a time
+    # The cache is shared with TIKR_xlsx, so it can hold symbols the companies table doesn't know
+    known = set(get_symbols_from_db(conn))
+    ids = metrics.metric_ids(conn)
+    batch, symbols = [], []
+    for envelope in TIKR.cache.entries():
+        symbol = envelope['symbol']
+        if symbol not in known:
+            continue
+        period = tikr_parser.PERIOD_NAMES.get(str(envelope['params']['p']), 'FY')
+        scraper = TIKR(offline=True)
+        scraper.parseFinancials(envelope['response'], period)
+        batch.extend(financial_rows(symbol, scraper, ids))
+        symbols.append(symbol)
+        if len(symbols) >= batch_size:
+            _, changed = merge_financials(conn, batch)
+            refresh_snapshot(conn, set(symbols))
+            conn.commit()
+            print(f'[ + ] Merged cached financials for {len(symbols)} responses ({changed} of {len(batch)} cells changed).')
+            batch, symbols = [], []
+    if symbols:
+        _, changed = merge_financials(conn, batch)
+        refresh_snapshot(conn, set(symbols))
+        conn.commit()
+        print(f'[ + ] Merged cached financials for {len(symbols)} responses ({changed} of {len(batch)} cells changed).')
+
 # Replace main logic
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='TIKR Statements Scraper to PostgreSQL')
+    parser.add_argument('--from-cache', action='store_true', help='load cached responses only, without calling TIKR')
+    parser.add_argument('--full', action='store_true', help='scrape every symbol, not only those stale in the scrape ledger')
+    parser.add_argument('--refresh-snapshot', action='store_true', help='rebuild latest_fundamentals for every symbol and exit')
+    args = parser.parse_args()
     conn = get_conn()
-    scraper = TIKR()
     print(f'[ . ] TIKR Statements Scraper: Ready')
+    if args.refresh_snapshot:
+        print(f'[ + ] Rebuilt latest_fundamentals for {refresh_snapshot(conn)} symbols')
+        conn.commit()
+        conn.close()
+        exit()
+    if args.from_cache:
+        insert_from_cache(conn)
+        conn.close()
+        print(f'[ . ] Done')
+        exit()
     symbols = get_symbols_from_db(conn)
     print(f'[ . ] Found {len(symbols)} symbols in database.')
-    for symbol in symbols:
-        tid, cid = scraper.find_company_info(symbol)
-        if not (tid and cid):
-            print(f'[ - ] [Error]: Could not find company for {symbol}')
-            continue
-        print(f'[ . ] Found company: {symbol} [Trading ID: {tid}] [Company ID: {cid}]')
-        scraper.getFinancials(tid, cid)
-        # Instead of Excel export, insert to DB
-        for statement in scraper.statements:
-            statement_name = statement['statement']
-            for year_data in scraper.content[statement_name]:
-                fiscal_year = year_data.get('year')
-                for key, value in year_data.items():
-                    if key == 'year':
-                        continue
-                    # Ensure value is a float or None
-                    db_value = value
-                    try:
-                        if value == '' or value is None:
-                            db_value = None
-                        else:
-                            db_value = float(value)
-                    except Exception:
-                        db_value = None
-                    with conn.cursor() as cur:
-                        cur.execute(
-                            """
-                            INSERT INTO financials (symbol, statement, fiscal_year, fiscal_period, key, value, currency)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s)
-                            ON CONFLICT DO NOTHING
-                            """,
-                            (symbol, statement_name, fiscal_year, 'FY', key, db_value, 'USD')
-                        )
-                conn.commit()
-        print(f'[ + ] Inserted financials for {symbol} into database.')
-        wait_time = random.randint(40, 80)
-        print(f'[ . ] Waiting {wait_time} seconds before next symbol...')
-        time.sleep(wait_time)
+    asyncio.run(scrape_symbols(conn, symbols, full=args.full))
     conn.close()
     print(f'[ . ] Done')
 
@@ -0,0 +1,194 @@
+import argparse
+import multiprocessing
+import os
+import random
+import time
+
+from tikr_client import TIKR
+from TIKR_to_PostgreSQL import REFRESH_DAYS, get_conn, get_symbols_from_db, get_stale_symbols, store_company
+
+# Multi-process batch runner for TIKR_to_PostgreSQL.
+# Work lives in the scrape_queue table, so a crash, Ctrl-C or expired token
+# only loses the companies that were in flight: run the script again and it
+# picks up the remaining symbols. Workers share the access token through
+# token.tmp (see tikr_token.TokenManager). Failed symbols go back to the queue
+# and are retried after a backoff that doubles with every attempt.
+# Usage: python batch_runner.py --workers 4 [--new-run] [--full]
+
+WORKERS = int(os.getenv('TIKR_WORKERS', 4))
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF = int(os.getenv('TIKR_RETRY_BACKOFF', 300))  # seconds before the first retry, doubled per attempt
+PROGRESS_INTERVAL = 10  # seconds
+
+
+def enqueue(conn, full=False):
+    """Start a new run: fill scrape_queue with every symbol that needs scraping."""
+    symbols = get_symbols_from_db(conn)
+    if not full:
+        symbols = get_stale_symbols(conn, symbols)
+    resolved = TIKR().find_companies(symbols)
+    rows = [(s, *resolved[s]) for s in symbols if all(resolved[s])]
+    with conn.cursor() as cur:
+        cur.execute("TRUNCATE scrape_queue")
+        cur.executemany("INSERT INTO scrape_queue (symbol, tid, cid) VALUES (%s, %s, %s)", rows)
+    conn.commit()
+    print(f'[ . ] Queued {len(rows)} symbols ({len(symbols) - len(rows)} could not be resolved).')
+
+
+def recover(conn):
+    """Return work claimed by workers of an interrupted run to the queue. Returns the remaining count."""
+    with conn.cursor() as cur:
+        cur.execute("UPDATE scrape_queue SET status = 'pending', claimed_at = NULL WHERE status = 'running'")
+        cur.execute("SELECT count(*) FROM scrape_queue WHERE status = 'pending'")
+        remaining = cur.fetchone()[0]
+    conn.commit()
+    return remaining
+
+
+def claim(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE scrape_queue SET status = 'running', claimed_at = CURRENT_TIMESTAMP, attempts = attempts + 1
+            WHERE symbol = (
+                SELECT symbol FROM scrape_queue
+                WHERE status = 'pending' AND (not_before IS NULL OR not_before <= CURRENT_TIMESTAMP)
+                ORDER BY symbol LIMIT 1 FOR UPDATE SKIP LOCKED
+            )
+            RETURNING symbol, tid, cid, attempts
+            """
+        )
+        row = cur.fetchone()
+    conn.commit()
+    return row
+
+
+def next_retry(conn):
+    """Seconds until the earliest pending retry can be claimed, or None when nothing is waiting."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT EXTRACT(EPOCH FROM MIN(not_before) - CURRENT_TIMESTAMP) FROM scrape_queue
+            WHERE status = 'pending' AND not_before IS NOT NULL
+            """
+        )
+        wait = cur.fetchone()[0]
+    conn.commit()
+    return None if wait is None else max(float(wait), 0)
+
+
+def finish(conn, symbol, error=None, attempts=0):
+    """Mark a symbol done, or return it to the queue with an exponential backoff until MAX_ATTEMPTS."""
+    if error is None:
+        status = 'done'
+    else:
+        status = 'pending' if attempts < MAX_ATTEMPTS else 'failed'
+    backoff = RETRY_BACKOFF * 2 ** (attempts - 1) if status == 'pending' else None
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            UPDATE scrape_queue SET status = %s, finished_at = CURRENT_TIMESTAMP, error = %s,
+                not_before = CURRENT_TIMESTAMP + make_interval(secs => %s)
+            WHERE symbol = %s
+            """,
+            (status, error, backoff, symbol)
+        )
+    conn.commit()
+
+
+def worker(delay):
+    conn = get_conn()
+    try:
+        while True:
+            row = claim(conn)
+            if row is None:
+                # Only symbols waiting out their retry backoff left: wait for the first one
+                wait = next_retry(conn)
+                if wait is None:
+                    break
+                time.sleep(wait + 1)
+                continue
+            symbol, tid, cid, attempts = row
+            scraper = TIKR(max_cache_age=REFRESH_DAYS * 86400)
+            failed = False
+            try:
+                scraper.getFinancials(tid, cid, symbol)
+                with conn.cursor() as cur:
+                    cur.execute("SELECT fingerprint FROM scrape_ledger WHERE symbol = %s", (symbol,))
+                    previous = cur.fetchone()
+                store_company(conn, symbol, tid, cid, scraper, previous[0] if previous else None)
+            except Exception as err:
+                conn.rollback()
+                print(f'[ - ] [Error]: {symbol} failed (attempt {attempts}): {err}')
+                finish(conn, symbol, str(err), attempts)
+                failed = True
+            else:
+                finish(conn, symbol)
+            # Failed fetches count against TIKR too, so they are followed by the same pause
+            if delay and (failed or not scraper.served_from_cache):
+                time.sleep(random.uniform(*delay))
+    finally:
+        conn.close()
+
+
+def progress(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT status, count(*) FROM scrape_queue GROUP BY status")
+        counts = dict(cur.fetchall())
+    conn.commit()
+    return counts
+
+
+def format_eta(seconds):
+    seconds = int(seconds)
+    return f'{seconds // 3600}h{seconds % 3600 // 60:02d}m{seconds % 60:02d}s'
+
+
+def monitor(conn, processes):
+    start = time.time()
+    start_done = progress(conn).get('done', 0)
+    while any(p.is_alive() for p in processes):
+        time.sleep(PROGRESS_INTERVAL)
+        counts = progress(conn)
+        done, failed = counts.get('done', 0), counts.get('failed', 0)
+        total = sum(counts.values())
+        rate = (done - start_done) / (time.time() - start)
+        remaining = counts.get('pending', 0) + counts.get('running', 0)
+        eta = format_eta(remaining / rate) if rate else '--'
+        print(f'[ . ] {done}/{total} done, {failed} failed, {rate * 3600:.0f} symbols/h, ETA {eta}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scrape the companies table into PostgreSQL with several worker processes')
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--new-run', action='store_true', help='discard any unfinished run and queue symbols again')
+    parser.add_argument('--full', action='store_true', help='queue every symbol, not only those stale in the scrape ledger')
+    parser.add_argument('--no-delay', action='store_true', help='skip the 40-80s pause between fetches')
+    args = parser.parse_args()
+
+    conn = get_conn()
+    remaining = 0 if args.new_run else recover(conn)
+    if remaining:
+        print(f'[ . ] Resuming previous run: {remaining} symbols left.')
+    else:
+        enqueue(conn, full=args.full)
+
+    delay = None if args.no_delay else (40, 80)
+    processes = [multiprocessing.Process(target=worker, args=(delay,)) for _ in range(args.workers)]
+    for p in processes:
+        p.start()
+    try:
+        monitor(conn, processes)
+    except KeyboardInterrupt:
+        print('[ ! ] Interrupted, stopping workers. Run again to resume.')
+        for p in processes:
+            p.terminate()
+    for p in processes:
+        p.join()
+    counts = progress(conn)
+    conn.close()
+    print(f"[ . ] Done: {counts.get('done', 0)} done, {counts.get('failed', 0)} failed, {counts.get('pending', 0)} pending")
+
+
+if __name__ == '__main__':
+    main()
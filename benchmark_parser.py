@@ -0,0 +1,154 @@
+import argparse
+import glob
+import json
+import os
+import random
+import time
+
+import keys
+import tikr_cache
+import tikr_parser
+
+# Benchmark parse time per company for recorded /prod/fin payloads.
+# Usage: python benchmark_parser.py --payloads Output/cache --repeat 20
+# The payload directory is either a response cache (*.json.gz envelopes written
+# by tikr_cache) or a folder of raw /prod/fin responses saved as *.json.
+# Without recorded payloads a synthetic 25-year company is generated instead.
+
+
+def legacy_decode(response, statements):
+    """The original filter-based loop from TIKR.getFinancials, kept as the baseline."""
+    content = {s['statement']: [] for s in statements}
+    for fiscalyear in response['dates']:
+        fiscal_year_data = list(filter(lambda x: x['financialperiodid'] == fiscalyear['financialperiodid'], response['data']))
+        year_data = {s['statement']: {} for s in statements}
+        for statement in statements:
+            ACCESS_DENIED = 0
+            data = year_data[statement['statement']]
+            data['year'] = fiscalyear['calendaryear']
+            for column in statement['keys']:
+                if column == 'Free Cash Flow':
+                    cash_from_ops = list(filter(lambda x: x['dataitemid'] == 2006, fiscal_year_data))
+                    capital_expen = list(filter(lambda x: x['dataitemid'] == 2021, fiscal_year_data))
+                    if cash_from_ops and capital_expen:
+                        data[column] = float(cash_from_ops[0]['dataitemvalue']) + float(capital_expen[0]['dataitemvalue'])
+                    continue
+                elif column == '% Free Cash Flow Margins' and 'Free Cash Flow' in data:
+                    FCF = data['Free Cash Flow']
+                    revenue = list(filter(lambda x: x['dataitemid'] == statements[0]['keys']['Revenues'], fiscal_year_data))
+                    if revenue:
+                        data[column] = (float(FCF) / float(revenue[0]['dataitemvalue'])) * 100
+                    continue
+                value = list(filter(lambda x: x['dataitemid'] == statement['keys'][column], fiscal_year_data))
+                if value:
+                    if value[0]['dataitemvalue'] == '1.11':
+                        ACCESS_DENIED += 1
+                        data[column] = ''
+                    else:
+                        if column in ['Income Tax Expense']:
+                            data[column] = float(value[0]['dataitemvalue']) * -1
+                        else:
+                            data[column] = float(value[0]['dataitemvalue'])
+                else:
+                    data[column] = ''
+            if ACCESS_DENIED > 10: continue
+            content[statement['statement']].append(year_data[statement['statement']])
+    return content
+
+
+def synthetic_payload(years=25, seed=0):
+    rng = random.Random(seed)
+    dataitemids = sorted(set(keys.keys) | {v for s in keys.statements for v in s['keys'].values() if v != ''})
+    dates, data = [], []
+    for i in range(years):
+        period = 100000 + i
+        dates.append({'financialperiodid': period, 'calendaryear': 2000 + i})
+        denied = i < 3  # free accounts only see recent years
+        for dataitemid in dataitemids:
+            if rng.random() < 0.1:
+                continue
+            value = '1.11' if denied else str(round(rng.uniform(-1e5, 1e6), 3))
+            data.append({'financialperiodid': period, 'dataitemid': dataitemid, 'dataitemvalue': value})
+    rng.shuffle(data)
+    return {'dates': dates, 'data': data}
+
+
+def columnar_decode(response, statements):
+    frames = tikr_parser.build_frames(response, statements)
+    return {name: tikr_parser.frame_records(frame) for name, frame in frames.items()}
+
+
+def without_yoy(content):
+    # The dict decoders never filled YoY columns or fiscal_period, so leave them out of the comparison
+    return {
+        name: [{k: ('' if k.endswith(' YoY') else v) for k, v in year.items() if k != 'fiscal_period'} for year in years]
+        for name, years in content.items()
+    }
+
+
+def same_content(a, b):
+    a, b = without_yoy(a), without_yoy(b)
+    for name in a:
+        if len(a[name]) != len(b[name]):
+            return False
+        for x, y in zip(a[name], b[name]):
+            for key in set(x) | set(y):
+                vx, vy = x.get(key, ''), y.get(key, '')
+                if vx == '' or vy == '':
+                    if vx != vy:
+                        return False
+                elif abs(vx - vy) > 1e-9 * max(1.0, abs(vx)):
+                    return False
+    return True
+
+
+def load_payloads(directory):
+    payloads = []
+    for envelope in tikr_cache.ResponseCache(directory).entries():
+        payloads.append((envelope['symbol'] or f"{envelope['params']['tid']}-{envelope['params']['cid']}", envelope['response']))
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path, 'r') as f:
+            response = json.load(f)
+        if 'dates' in response:
+            payloads.append((os.path.basename(path), response))
+    return payloads
+
+
+def time_per_company(decode, payloads, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _, response in payloads:
+            decode(response, keys.statements)
+    return (time.perf_counter() - start) / (repeat * len(payloads))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark /prod/fin parsing per company')
+    parser.add_argument('--payloads', default=tikr_cache.CACHE_DIR, help='response cache or directory of recorded /prod/fin JSON responses')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    payloads = load_payloads(args.payloads) if os.path.isdir(args.payloads) else []
+    if not payloads:
+        print(f'[ . ] No recorded payloads in {args.payloads}, using a synthetic 25-year company')
+        payloads = [('synthetic', synthetic_payload())]
+
+    for name, response in payloads:
+        legacy = legacy_decode(response, keys.statements)
+        if legacy != tikr_parser.decode_financials(response, keys.statements):
+            raise SystemExit(f'[ - ] Hash index decoder disagrees on {name}')
+        if not same_content(legacy, columnar_decode(response, keys.statements)):
+            raise SystemExit(f'[ - ] Columnar decoder disagrees on {name}')
+
+    rows = sum(len(r['data']) for _, r in payloads) / len(payloads)
+    before = time_per_company(legacy_decode, payloads, args.repeat)
+    after = time_per_company(tikr_parser.decode_financials, payloads, args.repeat)
+    columnar = time_per_company(tikr_parser.build_frames, payloads, args.repeat)
+    print(f'[ . ] {len(payloads)} companies, {rows:.0f} data rows per company on average')
+    print(f'[ . ] filter scan : {before * 1000:9.2f} ms/company')
+    print(f'[ . ] hash index  : {after * 1000:9.2f} ms/company ({before / after:.1f}x faster)')
+    print(f'[ . ] columnar    : {columnar * 1000:9.2f} ms/company ({before / columnar:.1f}x faster)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from load_prices import load_prices, price_files
+from load_to_postgres import get_conn
+
+# Benchmark load_prices.py on synthetic daily bars.
+# Usage: python benchmark_prices.py --symbols 200 --years 20 [--workers 4]
+# Needs a local Postgres with create_pg_tables.sql applied. Files are written
+# in FirstRate's headerless layout to a temporary directory; the loaded rows
+# are deleted again afterwards.
+
+
+def synthetic_prices(directory, symbols, years):
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=years * 252)
+    rng = np.random.default_rng(0)
+    for i in range(symbols):
+        close = 50 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+        df = pd.DataFrame({
+            'date': dates.strftime('%Y-%m-%d'),
+            'open': close * (1 + rng.normal(0, 0.005, len(dates))),
+            'high': close * 1.01,
+            'low': close * 0.99,
+            'close': close,
+            'volume': rng.integers(1e5, 1e7, len(dates)),
+        }).round(4)
+        df.to_csv(os.path.join(directory, f'ZZB{i:04d}_full_1day_adjsplitdiv.txt'), header=False, index=False)
+
+
+def cleanup(conn, symbols):
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM prices WHERE symbol = ANY(%s)", (symbols,))
+        cur.execute("DELETE FROM price_loads WHERE symbol = ANY(%s)", (symbols,))
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark bulk-loading daily bars into the prices table')
+    parser.add_argument('--symbols', type=int, default=200)
+    parser.add_argument('--years', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='prices_')
+    conn = get_conn()
+    try:
+        synthetic_prices(directory, args.symbols, args.years)
+        files = price_files(directory)
+        loaded, rows, elapsed = load_prices(conn, files, workers=args.workers)
+        _, _, rerun = load_prices(conn, files, workers=args.workers)
+        cleanup(conn, list(files))
+    finally:
+        conn.close()
+        shutil.rmtree(directory)
+
+    print(f'[ . ] {loaded} symbols, {rows / max(loaded, 1):.0f} bars per symbol, {args.workers} workers')
+    print(f'[ . ] COPY load     : {rows / elapsed:10.0f} rows/s ({elapsed / max(loaded, 1) * 1000:.1f} ms/symbol)')
+    print(f'[ . ] resumed re-run: {rerun:10.2f} s (unchanged files skipped)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import argparse
+import time
+
+import benchmark_parser
+import metrics
+from financials_writer import copy_financials, merge_financials
+from tikr_client import TIKR
+from TIKR_to_PostgreSQL import get_conn, financial_rows
+
+# Benchmark writing parsed companies into the financials table.
+# Usage: python benchmark_writer.py --companies 20 --years 25
+# Needs a local Postgres with create_pg_tables.sql applied. Synthetic financials
+# are written for throwaway companies ZZB0000, ZZB0001, ... which are created
+# up front and deleted again, history included, when the benchmark ends.
+
+
+def legacy_insert(conn, symbol, scraper):
+    """The original path: one INSERT per cell in its own cursor, one commit per year."""
+    year = None
+    for row in financial_rows(symbol, scraper, metrics.metric_ids(conn)):
+        # commit whenever (statement_id, fiscal_year, fiscal_period) changes
+        if year is not None and (row[1], row[3], row[4]) != year:
+            conn.commit()
+        year = (row[1], row[3], row[4])
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO financials (symbol, statement_id, metric_id, fiscal_year, fiscal_period, value, currency)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT DO NOTHING
+                """,
+                row
+            )
+    conn.commit()
+
+
+def copy_insert(conn, symbol, scraper):
+    copy_financials(conn, financial_rows(symbol, scraper, metrics.metric_ids(conn)))
+    conn.commit()
+
+
+def merge_insert(conn, symbol, scraper):
+    merge_financials(conn, financial_rows(symbol, scraper, metrics.metric_ids(conn)))
+    conn.commit()
+
+
+def benchmark_symbols(count):
+    return [f'ZZB{i:04d}' for i in range(count)]
+
+
+def clear_financials(conn, symbols):
+    """Delete the benchmark companies' financials and history; returns the financials rows removed."""
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM financials WHERE symbol = ANY(%s)", (symbols,))
+        rows = cur.rowcount
+        cur.execute("DELETE FROM financials_history WHERE symbol = ANY(%s)", (symbols,))
+    conn.commit()
+    return rows
+
+
+def add_companies(conn, symbols):
+    clear_financials(conn, symbols)  # leftovers of an interrupted run
+    with conn.cursor() as cur:
+        cur.executemany(
+            "INSERT INTO companies (symbol, short_name) VALUES (%s, 'Benchmark company') ON CONFLICT (symbol) DO NOTHING",
+            [(symbol,) for symbol in symbols]
+        )
+    conn.commit()
+
+
+def drop_companies(conn, symbols):
+    clear_financials(conn, symbols)
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM latest_fundamentals WHERE symbol = ANY(%s)", (symbols,))
+        cur.execute("DELETE FROM companies WHERE symbol = ANY(%s)", (symbols,))
+    conn.commit()
+
+
+def synthetic_companies(symbols, years):
+    companies = []
+    for seed, symbol in enumerate(symbols):
+        scraper = TIKR(offline=True)
+        scraper.parseFinancials(benchmark_parser.synthetic_payload(years=years, seed=seed))
+        companies.append((symbol, scraper))
+    return companies
+
+
+def run(conn, write, companies, preload=None):
+    """Time `write` over every company; `preload` writes the same companies first, untimed."""
+    for symbol, scraper in companies if preload else []:
+        preload(conn, symbol, scraper)
+    start = time.perf_counter()
+    for symbol, scraper in companies:
+        write(conn, symbol, scraper)
+    elapsed = time.perf_counter() - start
+    rows = clear_financials(conn, [symbol for symbol, _ in companies])
+    return rows, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark financials writes: per-cell INSERT vs COPY vs merge')
+    parser.add_argument('--companies', type=int, default=20)
+    parser.add_argument('--years', type=int, default=25)
+    args = parser.parse_args()
+
+    conn = get_conn()
+    symbols = benchmark_symbols(args.companies)
+    companies = synthetic_companies(symbols, args.years)
+    add_companies(conn, symbols)
+    try:
+        legacy_rows, legacy_time = run(conn, legacy_insert, companies)
+        copy_rows, copy_time = run(conn, copy_insert, companies)
+        merge_rows, merge_time = run(conn, merge_insert, companies)
+        _, rerun_time = run(conn, merge_insert, companies, preload=merge_insert)
+    finally:
+        conn.rollback()
+        drop_companies(conn, symbols)
+        conn.close()
+    if not legacy_rows == copy_rows == merge_rows:
+        raise SystemExit(f'[ - ] Row counts differ: INSERT wrote {legacy_rows}, COPY {copy_rows}, merge {merge_rows}')
+
+    print(f'[ . ] {len(companies)} companies, {copy_rows / len(companies):.0f} rows per company')
+    print(f'[ . ] INSERT per cell : {legacy_rows / legacy_time:10.0f} rows/s ({legacy_time / len(companies) * 1000:.1f} ms/company)')
+    print(f'[ . ] COPY per company: {copy_rows / copy_time:10.0f} rows/s ({copy_time / len(companies) * 1000:.1f} ms/company, {legacy_time / copy_time:.1f}x faster)')
+    print(f'[ . ] merge, new rows : {merge_rows / merge_time:10.0f} rows/s ({merge_time / len(companies) * 1000:.1f} ms/company)')
+    print(f'[ . ] merge, unchanged: {merge_rows / rerun_time:10.0f} rows/s ({rerun_time / len(companies) * 1000:.1f} ms/company)')
+
+
+if __name__ == '__main__':
+    main()
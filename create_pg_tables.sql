@@ -41,30 +41,157 @@ CREATE TABLE companies (
     -- Add more fields as needed from YF_FIELDS
 );
 
+-- Dimension tables for financials, seeded from keys.py by metrics.py
+DROP TABLE IF EXISTS statements CASCADE;
+CREATE TABLE statements (
+    id SMALLSERIAL PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL      -- e.g. 'income_statement', 'cashflow_statement', 'balancesheet_statement'
+);
+
+DROP TABLE IF EXISTS metrics CASCADE;
+CREATE TABLE metrics (
+    id SMALLSERIAL PRIMARY KEY,
+    statement_id SMALLINT NOT NULL REFERENCES statements(id),
+    key TEXT NOT NULL,             -- e.g. 'Net Income', 'Revenues', etc.
+    dataitemid INTEGER,            -- TIKR dataitemid, NULL for derived columns (YoY, Free Cash Flow, ...)
+    tikr_name TEXT,                -- TIKR's name for the dataitemid (keys.keys)
+    UNIQUE (statement_id, key)
+);
+
 DROP TABLE IF EXISTS financials CASCADE;
 CREATE TABLE financials (
     id SERIAL PRIMARY KEY,
     symbol TEXT REFERENCES companies(symbol),
-    statement TEXT,         -- e.g. 'income_statement', 'cashflow_statement', 'balancesheet_statement'
+    statement_id SMALLINT REFERENCES statements(id),
+    metric_id SMALLINT REFERENCES metrics(id),
     fiscal_year INTEGER,
-    fiscal_period TEXT,     -- e.g. 'FY', 'Q1', 'Q2', etc. (if you want quarterly granularity)
-    key TEXT,               -- e.g. 'Net Income', 'Revenues', etc.
+    fiscal_period TEXT,     -- 'FY', 'LTM', 'Q1' .. 'Q4'
     value DOUBLE PRECISION,
     currency TEXT DEFAULT 'USD',
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,  -- last time the value changed
+    CONSTRAINT uq_financials_cell UNIQUE (symbol, statement_id, fiscal_year, fiscal_period, metric_id)
 );
-CREATE INDEX idx_financials_symbol_statement_year_key ON financials(symbol, statement, fiscal_year, key);
+-- A symbol's latest year and that year's rows, for the screener's latest_financials
+CREATE INDEX idx_financials_symbol_year ON financials(symbol, fiscal_year, fiscal_period);
+-- Range scans for the screener's metric filters (e.g. Total Revenues > 1e9) and top-K by a metric
+CREATE INDEX idx_financials_metric_value ON financials(metric_id, value, symbol) WHERE fiscal_period IN ('FY', 'LTM');
 
+-- Values replaced by a later scrape (restatements), see financials_writer.merge_financials
+DROP TABLE IF EXISTS financials_history CASCADE;
+CREATE TABLE financials_history (
+    symbol TEXT,
+    statement_id SMALLINT,
+    metric_id SMALLINT,
+    fiscal_year INTEGER,
+    fiscal_period TEXT,
+    value DOUBLE PRECISION,
+    valid_from TIMESTAMP,                        -- when the value was written
+    valid_to TIMESTAMP DEFAULT CURRENT_TIMESTAMP -- when it was replaced
+);
+CREATE INDEX idx_financials_history_symbol_metric ON financials_history(symbol, metric_id, fiscal_year);
+
+-- financials with the statement and key names, for readers of the old TEXT columns
+CREATE VIEW financials_named AS
+SELECT f.id, f.symbol, s.name AS statement, f.fiscal_year, f.fiscal_period, m.key, f.value, f.currency, f.updated_at
+FROM financials f
+JOIN statements s ON s.id = f.statement_id
+JOIN metrics m ON m.id = f.metric_id;
+
+-- One row per symbol with its latest annual/LTM values, see financials_writer.refresh_snapshot
+DROP TABLE IF EXISTS latest_fundamentals CASCADE;
+CREATE TABLE latest_fundamentals (
+    symbol TEXT PRIMARY KEY REFERENCES companies(symbol),
+    fiscal_year INTEGER,
+    fiscal_period TEXT,         -- 'LTM' or 'FY'
+    revenue DOUBLE PRECISION,
+    gross_profit DOUBLE PRECISION,
+    operating_income DOUBLE PRECISION,
+    net_income DOUBLE PRECISION,
+    ebitda DOUBLE PRECISION,
+    diluted_eps DOUBLE PRECISION,
+    free_cash_flow DOUBLE PRECISION,
+    total_assets DOUBLE PRECISION,
+    total_debt DOUBLE PRECISION,
+    net_debt DOUBLE PRECISION,
+    total_equity DOUBLE PRECISION,
+    gross_margin DOUBLE PRECISION,      -- %
+    ebitda_margin DOUBLE PRECISION,     -- %
+    net_margin DOUBLE PRECISION,        -- %
+    return_on_equity DOUBLE PRECISION,  -- %
+    debt_to_equity DOUBLE PRECISION,
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+-- Top-K by any snapshot column in either direction, see the screener's sort_segments
+CREATE INDEX idx_latest_fundamentals_revenue ON latest_fundamentals(revenue, symbol) WHERE revenue IS NOT NULL;
+CREATE INDEX idx_latest_fundamentals_gross_profit ON latest_fundamentals(gross_profit, symbol) WHERE gross_profit IS NOT NULL;
+CREATE INDEX idx_latest_fundamentals_operating_income ON latest_fundamentals(operating_income, symbol) WHERE operating_income IS NOT NULL;
+CREATE INDEX idx_latest_fundamentals_net_income ON latest_fundamentals(net_income, symbol) WHERE net_income IS NOT NULL;
+CREATE INDEX idx_latest_fundamentals_ebitda ON latest_fundamentals(ebitda, symbol) WHERE ebitda IS NOT NULL;
+CREATE INDEX idx_latest_fundamentals_diluted_eps ON latest_fundamentals(diluted_eps, symbol) WHERE diluted_eps IS NOT NULL;
+CREATE INDEX idx_latest_fundamentals_free_cash_flow ON latest_fundamentals(free_cash_flow, symbol) WHERE free_cash_flow IS NOT NULL;
+CREATE INDEX idx_latest_fundamentals_total_assets ON latest_fundamentals(total_assets, symbol) WHERE total_assets IS NOT NULL;
+CREATE INDEX idx_latest_fundamentals_total_debt ON latest_fundamentals(total_debt, symbol) WHERE total_debt IS NOT NULL;
+CREATE INDEX idx_latest_fundamentals_net_debt ON latest_fundamentals(net_debt, symbol) WHERE net_debt IS NOT NULL;
+CREATE INDEX idx_latest_fundamentals_total_equity ON latest_fundamentals(total_equity, symbol) WHERE total_equity IS NOT NULL;
+CREATE INDEX idx_latest_fundamentals_gross_margin ON latest_fundamentals(gross_margin, symbol) WHERE gross_margin IS NOT NULL;
+CREATE INDEX idx_latest_fundamentals_ebitda_margin ON latest_fundamentals(ebitda_margin, symbol) WHERE ebitda_margin IS NOT NULL;
+CREATE INDEX idx_latest_fundamentals_net_margin ON latest_fundamentals(net_margin, symbol) WHERE net_margin IS NOT NULL;
+CREATE INDEX idx_latest_fundamentals_return_on_equity ON latest_fundamentals(return_on_equity, symbol) WHERE return_on_equity IS NOT NULL;
+CREATE INDEX idx_latest_fundamentals_debt_to_equity ON latest_fundamentals(debt_to_equity, symbol) WHERE debt_to_equity IS NOT NULL;
+
+DROP TABLE IF EXISTS scrape_ledger CASCADE;
+CREATE TABLE scrape_ledger (
+    symbol TEXT PRIMARY KEY REFERENCES companies(symbol),
+    tid BIGINT,
+    cid BIGINT,
+    fetched_at TIMESTAMP,       -- last time TIKR was queried for this symbol
+    latest_period_id BIGINT,    -- newest financialperiodid in that response
+    fingerprint TEXT            -- sha256 of the response, see tikr_parser.fingerprint
+);
+
+DROP TABLE IF EXISTS scrape_queue CASCADE;
+CREATE TABLE scrape_queue (
+    symbol TEXT PRIMARY KEY REFERENCES companies(symbol),
+    tid BIGINT,
+    cid BIGINT,
+    status TEXT NOT NULL DEFAULT 'pending',  -- 'pending', 'running', 'done' or 'failed'
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    not_before TIMESTAMP,                    -- failed symbols are not retried before this time
+    error TEXT
+);
+CREATE INDEX idx_scrape_queue_status ON scrape_queue(status);
+
+-- Daily bars, range-partitioned by year; load_prices.py creates the yearly
+-- partitions. Date range scans are pruned to their yearly partitions, with a
+-- small BRIN index on date inside them; per-symbol reads and the loader's
+-- delete-and-reload use the (symbol, date) btree, since parallel workers and
+-- reloads interleave symbols within a partition
 DROP TABLE IF EXISTS prices CASCADE;
 CREATE TABLE prices (
-    id SERIAL PRIMARY KEY,
-    symbol TEXT REFERENCES companies(symbol),
-    date DATE,
+    symbol TEXT NOT NULL,
+    date DATE NOT NULL,
     open DOUBLE PRECISION,
     high DOUBLE PRECISION,
     low DOUBLE PRECISION,
     close DOUBLE PRECISION,
     volume BIGINT,
     adj_close DOUBLE PRECISION
-);
-CREATE INDEX idx_prices_symbol_date ON prices(symbol, date); 
\ No newline at end of file
+) PARTITION BY RANGE (date);
+CREATE TABLE prices_default PARTITION OF prices DEFAULT;
+CREATE INDEX idx_prices_date_brin ON prices USING BRIN (date);
+CREATE INDEX idx_prices_symbol_date ON prices (symbol, date);
+
+-- One row per symbol loaded by load_prices.py, used to skip unchanged files on re-runs
+DROP TABLE IF EXISTS price_loads CASCADE;
+CREATE TABLE price_loads (
+    symbol TEXT PRIMARY KEY,
+    source TEXT,                -- file the bars came from
+    source_size BIGINT,
+    source_mtime DOUBLE PRECISION,
+    rows INTEGER,
+    first_date DATE,
+    last_date DATE,
+    loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+); 
\ No newline at end of file
@@ -0,0 +1,213 @@
+import csv
+import io
+import re
+
+import metrics
+
+# Bulk writes into the financials table, shared by the scraper and load_to_postgres.
+# Rows are (symbol, statement_id, metric_id, fiscal_year, fiscal_period, value, currency).
+
+FINANCIALS_COLUMNS = ('symbol', 'statement_id', 'metric_id', 'fiscal_year', 'fiscal_period', 'value', 'currency')
+FINANCIALS_KEY = ('symbol', 'statement_id', 'fiscal_year', 'fiscal_period', 'metric_id')
+
+
+def copy_financials(conn, rows, table='financials'):
+    """Stream rows into `table` with a single COPY FROM STDIN. Does not commit; returns the row count."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    count = 0
+    for row in rows:
+        # Unquoted empty fields are NULL in COPY's csv format
+        writer.writerow(['' if v is None else v for v in row])
+        count += 1
+    buffer.seek(0)
+    with conn.cursor() as cur:
+        cur.copy_expert(f"COPY {table} ({', '.join(FINANCIALS_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    return count
+
+
+def merge_financials(conn, rows):
+    """Upsert rows into financials, only touching cells whose value changed.
+
+    Rows are COPYed into a temporary staging table first. The previous value of
+    every changed cell is moved to financials_history before it is
+    overwritten. Does not commit; returns (staged, changed) row counts.
+    """
+    # The first row for a key wins, like the parser's first-occurrence rule
+    unique = {}
+    for row in rows:
+        unique.setdefault((row[0], row[1], row[3], row[4], row[2]), row)
+    key = ', '.join(FINANCIALS_KEY)
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            CREATE TEMP TABLE IF NOT EXISTS financials_stage (
+                symbol TEXT, statement_id SMALLINT, metric_id SMALLINT, fiscal_year INTEGER,
+                fiscal_period TEXT, value DOUBLE PRECISION, currency TEXT
+            ) ON COMMIT DELETE ROWS
+            """
+        )
+    staged = copy_financials(conn, unique.values(), table='financials_stage')
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            INSERT INTO financials_history (symbol, statement_id, metric_id, fiscal_year, fiscal_period, value, valid_from)
+            SELECT f.symbol, f.statement_id, f.metric_id, f.fiscal_year, f.fiscal_period, f.value, f.updated_at
+            FROM financials f
+            JOIN financials_stage s USING ({key})
+            WHERE f.value IS DISTINCT FROM s.value
+            """
+        )
+        cur.execute(
+            f"""
+            INSERT INTO financials ({', '.join(FINANCIALS_COLUMNS)})
+            SELECT {', '.join(FINANCIALS_COLUMNS)} FROM financials_stage
+            ON CONFLICT ({key}) DO UPDATE SET
+                value = EXCLUDED.value,
+                currency = EXCLUDED.currency,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE financials.value IS DISTINCT FROM EXCLUDED.value
+            """
+        )
+        changed = cur.rowcount
+        cur.execute("TRUNCATE financials_stage")
+    return staged, changed
+
+
+def refresh_snapshot(conn, symbols=None):
+    """Rebuild the latest_fundamentals rows of `symbols` (every symbol when None). Does not commit.
+
+    A symbol's latest period is its newest annual fiscal year, preferring the
+    LTM row over FY within that year; each SNAPSHOT_COLUMNS metric of that
+    period becomes one column.
+    """
+    ids = metrics.metric_ids(conn)
+    columns = list(metrics.SNAPSHOT_COLUMNS)
+    pivots = ', '.join(f'MAX(f.value) FILTER (WHERE f.metric_id = %s) AS {c}' for c in columns)
+    params = [ids[metrics.SNAPSHOT_COLUMNS[c]][1] for c in columns]
+    where = '' if symbols is None else 'AND symbol = ANY(%s)'
+    with conn.cursor() as cur:
+        if symbols is None:
+            cur.execute("TRUNCATE latest_fundamentals")
+        else:
+            symbols = list(symbols)
+            cur.execute("DELETE FROM latest_fundamentals WHERE symbol = ANY(%s)", (symbols,))
+        cur.execute(
+            f"""
+            WITH latest AS (
+                SELECT DISTINCT ON (symbol) symbol, fiscal_year, fiscal_period
+                FROM financials
+                WHERE fiscal_period IN ('FY', 'LTM') {where}
+                ORDER BY symbol, fiscal_year DESC, fiscal_period = 'LTM' DESC
+            )
+            INSERT INTO latest_fundamentals (symbol, fiscal_year, fiscal_period, {', '.join(columns)})
+            SELECT l.symbol, l.fiscal_year, l.fiscal_period, {pivots}
+            FROM latest l
+            JOIN financials f ON f.symbol = l.symbol AND f.fiscal_year = l.fiscal_year AND f.fiscal_period = l.fiscal_period
+            GROUP BY l.symbol, l.fiscal_year, l.fiscal_period
+            """,
+            params if symbols is None else [symbols] + params
+        )
+        return cur.rowcount
+
+
+def same_cell(a, b):
+    """SQL condition matching rows of aliases `a` and `b` on FINANCIALS_KEY."""
+    return ' AND '.join(f'{a}.{column} = {b}.{column}' for column in FINANCIALS_KEY)
+
+
+def create_financials_staging(conn, table='financials_load'):
+    """Create an empty, unlogged, index-free copy of financials for swap_financials. Commits."""
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {table}")
+        cur.execute(f"CREATE UNLOGGED TABLE {table} (LIKE financials INCLUDING DEFAULTS)")
+    conn.commit()
+
+
+def swap_financials(conn, table='financials_load'):
+    """Replace financials with `table`, which holds the new rows of every symbol it mentions.
+
+    Cells repeated in `table` keep their first row and unchanged cells keep
+    their updated_at. Writers are blocked (SHARE lock) while the other symbols'
+    rows are carried over, changed values go to financials_history and the
+    table gets logged and indexed; readers keep using the old table until the
+    final rename, which only holds an exclusive lock for the catalog changes.
+    Views on financials are recreated on the new table. Commits; returns the
+    symbols in the batch.
+
+    Every other symbol's rows are copied into `table` as well, so a swap costs
+    a rewrite of the whole financials table, and scraper writes wait for that
+    copy. It pays off for full or near-full reloads; merge_financials suits
+    loads of a few symbols better.
+    """
+    key = ', '.join(FINANCIALS_KEY)
+    with conn.cursor() as cur:
+        cur.execute("LOCK TABLE financials IN SHARE MODE")
+        cur.execute(f"SELECT DISTINCT symbol FROM {table}")
+        symbols = [row[0] for row in cur.fetchall()]
+        # Parts are only deduplicated on their own; keep one row per cell across parts
+        cur.execute(f"DELETE FROM {table} t USING {table} d WHERE {same_cell('d', 't')} AND d.id < t.id")
+        # Unchanged cells keep the time their value last changed
+        cur.execute(f"""
+            UPDATE {table} n SET updated_at = f.updated_at
+            FROM financials f
+            WHERE {same_cell('f', 'n')}
+            AND f.symbol = ANY(%s) AND f.value IS NOT DISTINCT FROM n.value
+        """, (symbols,))
+        cur.execute(f"INSERT INTO {table} SELECT * FROM financials WHERE symbol <> ALL(%s)", (symbols,))
+        cur.execute(f"ALTER TABLE {table} SET LOGGED")
+        cur.execute(f"""
+            ALTER TABLE {table}
+                ADD CONSTRAINT {table}_pkey PRIMARY KEY (id),
+                ADD CONSTRAINT uq_{table}_cell UNIQUE ({key}),
+                ADD CONSTRAINT financials_symbol_fkey FOREIGN KEY (symbol) REFERENCES companies(symbol),
+                ADD CONSTRAINT financials_statement_id_fkey FOREIGN KEY (statement_id) REFERENCES statements(id),
+                ADD CONSTRAINT financials_metric_id_fkey FOREIGN KEY (metric_id) REFERENCES metrics(id)
+        """)
+        # Secondary indexes are copied from the live table under a temporary name
+        cur.execute(
+            """
+            SELECT indexname, indexdef FROM pg_indexes
+            WHERE schemaname = current_schema() AND tablename = 'financials'
+            AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = 'financials'::regclass)
+            """
+        )
+        indexes = cur.fetchall()
+        for name, definition in indexes:
+            cur.execute(re.sub(r' ON (\S+\.)?financials ', f' ON {table} ', definition.replace(f' {name} ', f' {table}_{name} ', 1), count=1))
+        cur.execute(f"""
+            INSERT INTO financials_history (symbol, statement_id, metric_id, fiscal_year, fiscal_period, value, valid_from)
+            SELECT f.symbol, f.statement_id, f.metric_id, f.fiscal_year, f.fiscal_period, f.value, f.updated_at
+            FROM financials f
+            JOIN {table} n USING ({key})
+            WHERE f.symbol = ANY(%s) AND f.value IS DISTINCT FROM n.value
+        """, (symbols,))
+        cur.execute(
+            """
+            SELECT view_name, pg_get_viewdef(quote_ident(view_name)::regclass)
+            FROM information_schema.view_table_usage
+            WHERE table_name = 'financials' AND view_schema = current_schema()
+            """
+        )
+        views = cur.fetchall()
+        cur.execute("SELECT pg_get_serial_sequence('financials', 'id')")
+        sequence = cur.fetchone()[0]
+
+        # Fresh statistics, so plans on the new table don't start from defaults
+        cur.execute(f"ANALYZE {table}")
+
+        # The swap itself: only catalog changes happen under the exclusive lock
+        cur.execute("LOCK TABLE financials IN ACCESS EXCLUSIVE MODE")
+        cur.execute("ALTER TABLE financials RENAME TO financials_old")
+        cur.execute(f"ALTER TABLE {table} RENAME TO financials")
+        for name, definition in views:
+            cur.execute(f"CREATE OR REPLACE VIEW {name} AS {definition}")
+        if sequence:
+            cur.execute(f"ALTER SEQUENCE {sequence} OWNED BY financials.id")
+        cur.execute("DROP TABLE financials_old")
+        cur.execute(f"ALTER TABLE financials RENAME CONSTRAINT {table}_pkey TO financials_pkey")
+        cur.execute(f"ALTER TABLE financials RENAME CONSTRAINT uq_{table}_cell TO uq_financials_cell")
+        for name, _ in indexes:
+            cur.execute(f"ALTER INDEX {table}_{name} RENAME TO {name}")
+    conn.commit()
+    return symbols
@@ -0,0 +1,210 @@
+import argparse
+import datetime
+import io
+import multiprocessing
+import os
+import re
+import time
+
+import pandas as pd
+
+from load_to_postgres import get_conn
+from symbol_index import symbols_from_csv
+
+# Bulk-load daily OHLCV bars into the partitioned prices table.
+# Usage: python load_prices.py --dir Output/prices [--universe all_tickers_firstratedata.csv] [--workers 4] [--full]
+# The directory holds one file per symbol, named SYMBOL.csv or SYMBOL_<anything>
+# (.csv, .txt or .parquet), e.g. FirstRate Data's AAPL_full_1day_adjsplitdiv.txt.
+# Files with a header row may use date/timestamp, open, high, low, close,
+# volume and adj_close columns; headerless files follow FirstRate's
+# timestamp,open,high,low,close,volume order; intraday bars are aggregated
+# into one bar per date. Each symbol is replaced in its own
+# transaction and recorded in price_loads, so an interrupted run resumes where
+# it stopped and unchanged files are skipped.
+
+PRICE_COLUMNS = ['symbol', 'date', 'open', 'high', 'low', 'close', 'volume', 'adj_close']
+HEADERLESS_COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume']
+COLUMN_ALIASES = {'timestamp': 'date', 'datetime': 'date', 'adj close': 'adj_close', 'adjclose': 'adj_close'}
+FIRST_YEAR = int(os.getenv('PRICES_FIRST_YEAR', 1970))
+WORKERS = int(os.getenv('LOAD_WORKERS', os.cpu_count() or 1))
+PRICE_FILE = re.compile(r'^(?P<symbol>[^_]+?)(?:_.*)?\.(?:csv|txt|parquet)$', re.IGNORECASE)
+
+
+def price_files(directory, universe=None):
+    """{symbol: path} for every price file in `directory`, optionally limited to `universe`."""
+    files = {}
+    for name in sorted(os.listdir(directory)):
+        match = PRICE_FILE.match(name)
+        if not match:
+            continue
+        symbol = match.group('symbol').upper()
+        if universe is None or symbol in universe:
+            files.setdefault(symbol, os.path.join(directory, name))
+    return files
+
+
+def ensure_partitions(conn, first_year=FIRST_YEAR, last_year=None):
+    """Create the yearly prices partitions from first_year through last_year (default: next year)."""
+    last_year = last_year or datetime.date.today().year + 1
+    with conn.cursor() as cur:
+        for year in range(first_year, last_year + 1):
+            cur.execute(
+                f"CREATE TABLE IF NOT EXISTS prices_{year} PARTITION OF prices "
+                f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+            )
+    conn.commit()
+
+
+def has_header(line):
+    """Whether a CSV's first line is a header: its first field is a known column name or not a date."""
+    field = line.split(',')[0].strip().strip('"')
+    if COLUMN_ALIASES.get(field.lower(), field.lower()) in PRICE_COLUMNS:
+        return True
+    try:
+        pd.to_datetime(field, format='ISO8601')
+    except (ValueError, TypeError):
+        return True
+    return False
+
+
+def read_prices(path, symbol):
+    """Read one symbol's bars into the PRICE_COLUMNS layout, sorted by date.
+
+    Intraday files are aggregated into daily bars: first open, highest high,
+    lowest low, last close and adj_close, summed volume.
+    """
+    if path.lower().endswith('.parquet'):
+        df = pd.read_parquet(path)
+    else:
+        with open(path, 'r') as f:
+            header = has_header(f.readline())
+        df = pd.read_csv(path, header=0 if header else None, names=None if header else HEADERLESS_COLUMNS)
+    df.columns = [COLUMN_ALIASES.get(str(c).strip().lower(), str(c).strip().lower()) for c in df.columns]
+    if 'date' not in df:
+        raise ValueError(f'{path} has no date/timestamp column')
+    df['symbol'] = symbol
+    for column in PRICE_COLUMNS:
+        if column not in df:
+            df[column] = None
+    df['volume'] = pd.to_numeric(df['volume'], errors='coerce').round().astype('Int64')
+    df['date'] = pd.to_datetime(df['date'], format='ISO8601')
+    df = df.sort_values('date', kind='stable')
+    df['date'] = df['date'].dt.date
+    if df['date'].duplicated().any():
+        # Intraday bars: aggregate each date into one daily bar
+        df = df.groupby('date', as_index=False).agg(
+            symbol=('symbol', 'first'),
+            open=('open', 'first'),
+            high=('high', 'max'),
+            low=('low', 'min'),
+            close=('close', 'last'),
+            volume=('volume', 'sum'),
+            adj_close=('adj_close', 'last'),
+        )
+    return df[PRICE_COLUMNS]
+
+
+def loaded_sources(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT symbol, source, source_size, source_mtime FROM price_loads")
+        return {row[0]: tuple(row[1:]) for row in cur.fetchall()}
+
+
+def source_stamp(path):
+    stat = os.stat(path)
+    return path, stat.st_size, stat.st_mtime
+
+
+def load_symbol(conn, symbol, path):
+    """Replace one symbol's bars with the contents of `path` and record it in price_loads. Commits.
+
+    Raises ValueError, leaving the stored bars alone, when the file has no bars.
+    """
+    df = read_prices(path, symbol)
+    if df.empty:
+        raise ValueError(f'{path} has no price bars')
+    buffer = io.StringIO()
+    df.to_csv(buffer, header=False, index=False)
+    buffer.seek(0)
+    source, size, mtime = source_stamp(path)
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM prices WHERE symbol = %s", (symbol,))
+        cur.copy_expert(f"COPY prices ({', '.join(PRICE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        cur.execute(
+            """
+            INSERT INTO price_loads (symbol, source, source_size, source_mtime, rows, first_date, last_date, loaded_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (symbol) DO UPDATE SET
+                source = EXCLUDED.source,
+                source_size = EXCLUDED.source_size,
+                source_mtime = EXCLUDED.source_mtime,
+                rows = EXCLUDED.rows,
+                first_date = EXCLUDED.first_date,
+                last_date = EXCLUDED.last_date,
+                loaded_at = EXCLUDED.loaded_at
+            """,
+            (symbol, source, size, mtime, len(df), df['date'].min() if len(df) else None, df['date'].max() if len(df) else None)
+        )
+    conn.commit()
+    return len(df)
+
+
+_worker = {}
+
+
+def _init_worker():
+    _worker['conn'] = get_conn()
+
+
+def _load(item):
+    symbol, path = item
+    try:
+        return symbol, load_symbol(_worker['conn'], symbol, path), None
+    except Exception as err:
+        _worker['conn'].rollback()
+        return symbol, 0, str(err)
+
+
+def load_prices(conn, files, workers=WORKERS, full=False):
+    """Load {symbol: path} with a process pool; returns (symbols loaded, rows, seconds)."""
+    ensure_partitions(conn)
+    if not full:
+        done = loaded_sources(conn)
+        skipped = [s for s, path in files.items() if done.get(s) == source_stamp(path)]
+        files = {s: path for s, path in files.items() if s not in set(skipped)}
+        if skipped:
+            print(f'[ . ] {len(skipped)} symbols already loaded from the same files, skipping them.')
+    start = time.time()
+    loaded = rows = 0
+    with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+        for symbol, count, error in pool.imap_unordered(_load, files.items()):
+            if error:
+                print(f'[ - ] [Error]: Loading prices for {symbol} failed: {error}')
+                continue
+            loaded += 1
+            rows += count
+            if loaded % 100 == 0 or loaded == len(files):
+                elapsed = time.time() - start
+                print(f'[ . ] {loaded}/{len(files)} symbols, {rows} rows, {rows / elapsed:.0f} rows/s')
+    return loaded, rows, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk-load daily OHLCV files into the partitioned prices table')
+    parser.add_argument('--dir', required=True, help='directory with one CSV/TXT/Parquet file per symbol')
+    parser.add_argument('--universe', help='ticker CSV limiting which symbols are loaded (e.g. all_tickers_firstratedata.csv)')
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--full', action='store_true', help='reload every file, not only new or changed ones')
+    args = parser.parse_args()
+
+    universe = set(symbols_from_csv(args.universe)) if args.universe else None
+    files = price_files(args.dir, universe)
+    print(f'[ . ] Found {len(files)} price files in {args.dir}')
+    conn = get_conn()
+    loaded, rows, elapsed = load_prices(conn, files, workers=args.workers, full=args.full)
+    conn.close()
+    print(f'[ + ] Loaded {loaded} symbols, {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/s)')
+
+
+if __name__ == '__main__':
+    main()
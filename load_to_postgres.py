@@ -1,9 +1,19 @@
+import argparse
+import csv
+import functools
+import io
+import multiprocessing
 import os
+import time
+import numpy as np
 import pandas as pd
 import psycopg2
-from psycopg2.extras import execute_values
+from psycopg2 import errors
 import math
 
+import metrics
+from financials_writer import FINANCIALS_COLUMNS, FINANCIALS_KEY, copy_financials, create_financials_staging, merge_financials, refresh_snapshot, swap_financials
+
 def get_conn():
     return psycopg2.connect(
         dbname=os.getenv('PGDATABASE', 'stockdb'),
@@ -13,90 +23,238 @@ def get_conn():
         port=int(os.getenv('PGPORT', 5432))
     )
 
-def safe_int(val):
-    if pd.isna(val) or val is None:
-        return None
-    try:
-        return int(float(val))
-    except Exception:
-        return None
-
-def safe_str(val):
-    if pd.isna(val) or val is None:
-        return None
-    return str(val)
-
-def load_companies(csv_path, conn):
-    df = pd.read_csv(csv_path)
-    # Map CSV columns to DB columns, fallback to original columns if yfinance ones are missing
-    col_map = {
-        'symbol': lambda row: row.get('symbol') or row.get('Symbol'),
-        'short_name': lambda row: row.get('shortName') or row.get('Name'),
-        'long_name': lambda row: row.get('longName') or row.get('Name'),
-        'display_name': lambda row: row.get('displayName') or row.get('Name'),
-        'language': lambda row: row.get('language'),
-        'region': lambda row: row.get('region'),
-        'exchange': lambda row: row.get('exchange') or row.get('Stock Exchange'),
-        'full_exchange_name': lambda row: row.get('fullExchangeName') or row.get('Stock Exchange (MIC)'),
-        'market': lambda row: row.get('market'),
-        'quote_type': lambda row: row.get('quoteType'),
-        'type_disp': lambda row: row.get('typeDisp'),
-        'exchange_timezone_name': lambda row: row.get('exchangeTimezoneName'),
-        'exchange_timezone_short_name': lambda row: row.get('exchangeTimezoneShortName'),
-        'gmt_offset_milliseconds': lambda row: safe_int(row.get('gmtOffSetMilliseconds')),
-        'market_state': lambda row: row.get('marketState'),
-        'message_board_id': lambda row: row.get('messageBoardId'),
-        'quote_source_name': lambda row: row.get('quoteSourceName'),
-        'triggerable': lambda row: safe_str(row.get('triggerable')),
-        'custom_price_alert_confidence': lambda row: safe_str(row.get('customPriceAlertConfidence')),
-        'has_pre_post_market_data': lambda row: safe_str(row.get('hasPrePostMarketData')),
-        'first_trade_date_milliseconds': lambda row: safe_int(row.get('firstTradeDateMilliseconds')),
-        'address1': lambda row: row.get('address1'),
-        'city': lambda row: row.get('city'),
-        'state': lambda row: row.get('state'),
-        'zip': lambda row: row.get('zip'),
-        'country': lambda row: row.get('country'),
-        'phone': lambda row: row.get('phone'),
-        'website': lambda row: row.get('website'),
-        'industry': lambda row: row.get('industry'),
-        'industry_key': lambda row: row.get('industryKey'),
-        'industry_disp': lambda row: row.get('industryDisp'),
-        'sector': lambda row: row.get('sector'),
-        'sector_key': lambda row: row.get('sectorKey'),
-        'sector_disp': lambda row: row.get('sectorDisp'),
-        'category': lambda row: row.get('category'),
-        'fund_family': lambda row: row.get('fundFamily'),
-        'legal_type': lambda row: row.get('legalType'),
-        'long_business_summary': lambda row: row.get('longBusinessSummary'),
-        'full_time_employees': lambda row: safe_int(row.get('fullTimeEmployees')),
-    }
-    records = []
-    for _, row in df.iterrows():
-        row_dict = row.to_dict()
-        record = [col_map[col](row_dict) for col in col_map]
-        records.append(tuple(record))
-    cols = list(col_map.keys())
-    query = f"INSERT INTO companies ({', '.join(cols)}) VALUES %s ON CONFLICT (symbol) DO NOTHING"
+# companies column -> CSV columns to take it from, first non-empty wins
+# (yfinance names first, then the marketstack fallback)
+COMPANY_COLUMNS = {
+    'symbol': ('symbol', 'Symbol'),
+    'short_name': ('shortName', 'Name'),
+    'long_name': ('longName', 'Name'),
+    'display_name': ('displayName', 'Name'),
+    'language': ('language',),
+    'region': ('region',),
+    'exchange': ('exchange', 'Stock Exchange'),
+    'full_exchange_name': ('fullExchangeName', 'Stock Exchange (MIC)'),
+    'market': ('market',),
+    'quote_type': ('quoteType',),
+    'type_disp': ('typeDisp',),
+    'exchange_timezone_name': ('exchangeTimezoneName',),
+    'exchange_timezone_short_name': ('exchangeTimezoneShortName',),
+    'gmt_offset_milliseconds': ('gmtOffSetMilliseconds',),
+    'market_state': ('marketState',),
+    'message_board_id': ('messageBoardId',),
+    'quote_source_name': ('quoteSourceName',),
+    'triggerable': ('triggerable',),
+    'custom_price_alert_confidence': ('customPriceAlertConfidence',),
+    'has_pre_post_market_data': ('hasPrePostMarketData',),
+    'first_trade_date_milliseconds': ('firstTradeDateMilliseconds',),
+    'address1': ('address1',),
+    'city': ('city',),
+    'state': ('state',),
+    'zip': ('zip',),
+    'country': ('country',),
+    'phone': ('phone',),
+    'website': ('website',),
+    'industry': ('industry',),
+    'industry_key': ('industryKey',),
+    'industry_disp': ('industryDisp',),
+    'sector': ('sector',),
+    'sector_key': ('sectorKey',),
+    'sector_disp': ('sectorDisp',),
+    'category': ('category',),
+    'fund_family': ('fundFamily',),
+    'legal_type': ('legalType',),
+    'long_business_summary': ('longBusinessSummary',),
+    'full_time_employees': ('fullTimeEmployees',),
+}
+INT_COLUMNS = {'gmt_offset_milliseconds', 'first_trade_date_milliseconds', 'full_time_employees'}
+CHUNK_SIZE = int(os.getenv('LOAD_CHUNK_SIZE', 5000))
+
+def to_int(series):
+    # Column-wise int(float(val)), None for anything that isn't a number
+    return np.trunc(pd.to_numeric(series, errors='coerce')).astype('Int64')
+
+def map_companies(chunk):
+    """Map one chunk of a yfinance/marketstack CSV (read as str) to the companies columns."""
+    out = pd.DataFrame(index=chunk.index)
+    for column, sources in COMPANY_COLUMNS.items():
+        values = pd.Series(None, index=chunk.index, dtype=object)
+        for source in sources:
+            if source in chunk:
+                values = values.fillna(chunk[source])
+        out[column] = to_int(values) if column in INT_COLUMNS else values
+    return out[out['symbol'].notna()]
+
+def load_companies(csv_path, conn, chunk_size=CHUNK_SIZE):
+    """Stream a companies CSV in chunks into a staging table, then upsert it into companies.
+
+    Only the mapped columns are read, as text, so zip codes and ids keep their
+    exact spelling. On conflict, non-empty CSV values replace the stored ones.
+    """
+    columns = list(COMPANY_COLUMNS)
+    wanted = {source for sources in COMPANY_COLUMNS.values() for source in sources}
     with conn.cursor() as cur:
-        execute_values(cur, query, records)
+        cur.execute("DROP TABLE IF EXISTS companies_stage")
+        cur.execute("CREATE TEMP TABLE companies_stage (LIKE companies)")
+        cur.execute("ALTER TABLE companies_stage ADD COLUMN row_number BIGSERIAL")
+        staged = 0
+        for chunk in pd.read_csv(csv_path, dtype=str, usecols=lambda c: c in wanted, chunksize=chunk_size):
+            buffer = io.StringIO()
+            map_companies(chunk).to_csv(buffer, header=False, index=False)
+            buffer.seek(0)
+            cur.copy_expert(f"COPY companies_stage ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+            staged += cur.rowcount
+        # A symbol listed twice keeps its last row
+        updates = ', '.join(f'{c} = COALESCE(EXCLUDED.{c}, companies.{c})' for c in columns[1:])
+        cur.execute(f"""
+            INSERT INTO companies ({', '.join(columns)})
+            SELECT DISTINCT ON (symbol) {', '.join(columns)}
+            FROM companies_stage
+            ORDER BY symbol, row_number DESC
+            ON CONFLICT (symbol) DO UPDATE SET {updates}
+        """)
+        merged = cur.rowcount
+        cur.execute("DROP TABLE companies_stage")
     conn.commit()
+    print(f'[ + ] Upserted {merged} companies from {staged} rows of {csv_path}')
+
+FINANCIALS_WORKERS = int(os.getenv('LOAD_WORKERS', os.cpu_count() or 1))
+PART_MB = int(os.getenv('LOAD_PART_MB', 32))  # CSV bytes per work unit
+FINANCIALS_DTYPES = {'symbol': str, 'statement': str, 'fiscal_period': str, 'key': str, 'currency': str}
+
+def financials_parts(path, part_bytes=PART_MB * 1024 * 1024):
+    """Split a financials dump into independent work units.
+
+    CSV files are cut into byte ranges that end on a line boundary (fields must
+    not contain newlines); Parquet files into their row groups.
+    """
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit('[ - ] Loading Parquet needs pyarrow: pip install pyarrow')
+        for row_group in range(pq.ParquetFile(path).num_row_groups):
+            yield 'parquet', path, row_group
+        return
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        names = next(csv.reader([f.readline().decode('utf-8')]))
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + part_bytes, size))
+            f.readline()  # finish the line the cut landed in
+            end = f.tell()
+            yield 'csv', path, (start, end, names)
+            start = end
+
+def read_part(kind, path, where):
+    if kind == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).read_row_group(where).to_pandas()
+    start, end, names = where
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return pd.read_csv(io.BytesIO(data), names=names, header=None, dtype=FINANCIALS_DTYPES, float_precision='round_trip')
 
-def load_financials(csv_path, conn):
-    df = pd.read_csv(csv_path)
-    cols = ['symbol', 'statement', 'fiscal_year', 'fiscal_period', 'key', 'value', 'currency']
-    df = df.where(pd.notnull(df), None)
-    tuples = [tuple(x) for x in df[cols].to_numpy()]
-    query = f"INSERT INTO financials ({', '.join(cols)}) VALUES %s"
+_worker = {}
+
+def _init_worker():
+    # One connection per worker process, plus the lookups every part needs
+    conn = get_conn()
+    ids = metrics.metric_ids(conn)
+    _worker['conn'] = conn
+    _worker['ids'] = pd.DataFrame(
+        [(statement, key, statement_id, metric_id) for (statement, key), (statement_id, metric_id) in ids.items()],
+        columns=['statement', 'key', 'statement_id', 'metric_id'],
+    )
     with conn.cursor() as cur:
-        execute_values(cur, query, tuples)
+        cur.execute("SELECT symbol FROM companies")
+        _worker['symbols'] = {row[0] for row in cur.fetchall()}
+    conn.commit()
+
+def load_part(part, table=None):
+    """Merge one work unit into financials, or just COPY it into the staging `table`.
+
+    Returns (rows read, rows staged, cells changed, symbols).
+    """
+    conn = _worker['conn']
+    df = read_part(*part)
+    read = len(df)
+    if 'fiscal_period' not in df:
+        df['fiscal_period'] = 'FY'
+    if 'currency' not in df:
+        df['currency'] = 'USD'
+    # Names -> dimension ids; unknown metrics and symbols are dropped
+    df = df.merge(_worker['ids'], on=['statement', 'key'], how='inner')
+    df = df[df['symbol'].isin(_worker['symbols'])]
+    df['fiscal_year'] = pd.to_numeric(df['fiscal_year'], errors='coerce').astype('Int64')
+    df['value'] = pd.to_numeric(df['value'], errors='coerce')
+    df = df[list(FINANCIALS_COLUMNS)].astype(object)
+    if table:
+        df = df.drop_duplicates(list(FINANCIALS_KEY))
+        staged = copy_financials(conn, df.where(df.notna(), None).itertuples(index=False, name=None), table=table)
+        conn.commit()
+        return read, staged, staged, df['symbol'].unique().tolist()
+    rows = list(df.where(df.notna(), None).itertuples(index=False, name=None))
+    for attempt in range(3):
+        try:
+            staged, changed = merge_financials(conn, rows)
+            conn.commit()
+            break
+        except errors.DeadlockDetected:
+            # Two workers upserting overlapping cells; retry this part
+            conn.rollback()
+    else:
+        raise RuntimeError(f'Part {part[2]} of {part[1]} deadlocked 3 times')
+    return read, staged, changed, df['symbol'].unique().tolist()
+
+def load_financials(path, conn, workers=FINANCIALS_WORKERS, swap=False):
+    """Load a financials dump (CSV or Parquet with symbol, statement, fiscal_year,
+    fiscal_period, key, value, currency columns) into financials in parallel.
+
+    Each worker process merges one part at a time over its own connection, so
+    memory stays at about one part per worker regardless of the file size.
+    With `swap`, parts are COPYed into an unlogged staging table instead, and
+    the dump replaces its symbols' rows in one atomic table swap
+    (financials_writer.swap_financials), so readers never see a partial load.
+    The swap copies every other symbol's rows too, so it is meant for full reloads.
+    """
+    start = time.time()
+    read = staged = changed = 0
+    symbols = set()
+    table = 'financials_load' if swap else None
+    if swap:
+        create_financials_staging(conn, table)
+    with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+        for part_read, part_staged, part_changed, part_symbols in pool.imap_unordered(functools.partial(load_part, table=table), financials_parts(path)):
+            read += part_read
+            staged += part_staged
+            changed += part_changed
+            symbols.update(part_symbols)
+            elapsed = time.time() - start
+            print(f'[ . ] {read} rows read, {changed} cells changed, {read / elapsed:.0f} rows/s')
+    if swap:
+        print(f'[ . ] Swapping in {staged} staged rows...')
+        swap_financials(conn, table)
+    refresh_snapshot(conn, symbols)
     conn.commit()
+    elapsed = time.time() - start
+    print(f'[ + ] {path}: {read} rows in {elapsed:.1f}s ({read / elapsed:.0f} rows/s), {staged - changed} unchanged, '
+          f'{changed} inserted or changed, {read - staged} skipped (unknown or duplicate)')
 
 def main():
+    parser = argparse.ArgumentParser(description='Load companies and financials into PostgreSQL')
+    parser.add_argument('--companies', default='marketstack_all_tickers_enriched.csv', help='companies CSV ("" to skip)')
+    parser.add_argument('--financials', help='financials CSV or Parquet dump')
+    parser.add_argument('--workers', type=int, default=FINANCIALS_WORKERS)
+    parser.add_argument('--swap', action='store_true', help='load into a staging table and swap it in atomically; the dump replaces its symbols. Rewrites all of financials and blocks scraper writes meanwhile, so meant for full reloads')
+    args = parser.parse_args()
     conn = get_conn()
-    load_companies('marketstack_all_tickers_enriched.csv', conn)
-    # Uncomment and adjust the next line when you have your financials CSV ready
-    # load_financials('your_financials.csv', conn)
+    if args.companies:
+        load_companies(args.companies, conn)
+    if args.financials:
+        load_financials(args.financials, conn, workers=args.workers, swap=args.swap)
     conn.close()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
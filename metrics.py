@@ -0,0 +1,81 @@
+import keys
+from psycopg2.extras import execute_values
+
+# statements / metrics dimension tables behind the compact financials table.
+# Ids are assigned on first sight and never renumbered, so adding a key to
+# keys.py only appends new metrics. Usage: python metrics.py (seeds the tables)
+
+_ids = None
+
+# latest_fundamentals column -> (statement, key), see create_pg_tables.sql
+SNAPSHOT_COLUMNS = {
+    'revenue': ('income_statement', 'Total Revenues'),
+    'gross_profit': ('income_statement', 'Gross Profit'),
+    'operating_income': ('income_statement', 'Operating Income'),
+    'net_income': ('income_statement', 'Net Income'),
+    'ebitda': ('income_statement', 'EBITDA'),
+    'diluted_eps': ('income_statement', 'Diluted EPS Excl Extra Items'),
+    'free_cash_flow': ('cashflow_statement', 'Free Cash Flow'),
+    'total_assets': ('balancesheet_statement', 'Total Assets '),
+    'total_debt': ('balancesheet_statement', 'Total Debt '),
+    'net_debt': ('balancesheet_statement', 'Net Debt'),
+    'total_equity': ('balancesheet_statement', 'Total Equity '),
+    'gross_margin': ('ratios', 'Gross Profit Margin %'),
+    'ebitda_margin': ('ratios', 'EBITDA Margin %'),
+    'net_margin': ('ratios', 'Net Income Margin %'),
+    'return_on_equity': ('ratios', 'Return On Equity %'),
+    'debt_to_equity': ('ratios', 'Total Debt / Equity'),
+}
+
+
+def seed_metrics(conn):
+    """Insert any statement or (statement, key) from keys.statements the tables don't have yet."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT name FROM statements")
+        known = {row[0] for row in cur.fetchall()}
+        # Only insert what is missing: a conflicting insert would still burn smallserial values
+        missing = [(s['statement'],) for s in keys.statements if s['statement'] not in known]
+        if missing:
+            execute_values(cur, "INSERT INTO statements (name) VALUES %s ON CONFLICT (name) DO NOTHING", missing)
+        cur.execute("SELECT name, id FROM statements")
+        statement_ids = dict(cur.fetchall())
+
+        cur.execute("SELECT statement_id, key FROM metrics")
+        known = set(cur.fetchall())
+        missing = [
+            (statement_ids[s['statement']], key, dataitemid or None, keys.keys.get(dataitemid))
+            for s in keys.statements
+            for key, dataitemid in s['keys'].items()
+            if (statement_ids[s['statement']], key) not in known
+        ]
+        if missing:
+            execute_values(
+                cur,
+                "INSERT INTO metrics (statement_id, key, dataitemid, tikr_name) VALUES %s ON CONFLICT (statement_id, key) DO NOTHING",
+                missing
+            )
+    conn.commit()
+    return len(missing)
+
+
+def metric_ids(conn):
+    """{(statement, key): (statement_id, metric_id)}, seeding the tables on first use in this process."""
+    global _ids
+    if _ids is None:
+        seed_metrics(conn)
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT s.name, m.key, s.id, m.id
+                FROM metrics m JOIN statements s ON s.id = m.statement_id
+                """
+            )
+            _ids = {(statement, key): (statement_id, metric_id) for statement, key, statement_id, metric_id in cur.fetchall()}
+    return _ids
+
+
+if __name__ == '__main__':
+    from load_to_postgres import get_conn
+    conn = get_conn()
+    print(f'[ + ] Seeded {seed_metrics(conn)} new metrics')
+    conn.close()
@@ -0,0 +1,158 @@
+import argparse
+import csv
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+INDEX_PATH = os.getenv('TIKR_SYMBOL_INDEX', os.path.join('Output', 'symbols.sqlite3'))
+NEGATIVE_TTL_DAYS = float(os.getenv('TIKR_NEGATIVE_TTL_DAYS', 7))
+LRU_SIZE = 4096
+
+
+class SymbolIndex:
+    """Persistent symbol -> (tradingitemid, companyid) map in SQLite.
+
+    Symbols that Algolia could not resolve are stored with NULL ids and
+    treated as known misses for NEGATIVE_TTL_DAYS. An in-memory LRU sits in
+    front of the database. get() returns (tid, cid), (None, None) for a known
+    miss, or None when the symbol still has to be looked up.
+    """
+
+    def __init__(self, path=INDEX_PATH, negative_ttl_days=NEGATIVE_TTL_DAYS, lru_size=LRU_SIZE):
+        self.path = path
+        self.negative_ttl = negative_ttl_days * 86400
+        self.lru_size = lru_size
+        self._lru = OrderedDict()
+        self._conn = None
+        self._lock = threading.RLock()
+
+    @property
+    def conn(self):
+        # Connect lazily so importing the scrapers doesn't create the file
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS symbols (
+                    symbol TEXT PRIMARY KEY,
+                    tid INTEGER,
+                    cid INTEGER,
+                    resolved_at REAL
+                )
+            """)
+            self._conn.commit()
+        return self._conn
+
+    def _remember(self, symbol, entry):
+        self._lru[symbol] = entry
+        self._lru.move_to_end(symbol)
+        if len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def _fresh(self, entry):
+        tid, cid, resolved_at = entry
+        return (tid and cid) or time.time() - resolved_at <= self.negative_ttl
+
+    def get(self, symbol):
+        with self._lock:
+            entry = self._lru.get(symbol)
+            if entry is None:
+                entry = self.conn.execute('SELECT tid, cid, resolved_at FROM symbols WHERE symbol = ?', (symbol,)).fetchone()
+                if entry is None:
+                    return None
+                self._remember(symbol, entry)
+            else:
+                self._lru.move_to_end(symbol)
+            if not self._fresh(entry):
+                return None
+            return entry[0], entry[1]
+
+    def put_many(self, items):
+        """Store an iterable of (symbol, tid, cid); tid/cid of None records a miss."""
+        now = time.time()
+        rows = [(symbol, tid or None, cid or None, now) for symbol, tid, cid in items]
+        with self._lock:
+            self.conn.executemany("""
+                INSERT INTO symbols (symbol, tid, cid, resolved_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (symbol) DO UPDATE SET tid = excluded.tid, cid = excluded.cid, resolved_at = excluded.resolved_at
+            """, rows)
+            self.conn.commit()
+            for symbol, tid, cid, resolved_at in rows:
+                self._remember(symbol, (tid, cid, resolved_at))
+
+    def put(self, symbol, tid, cid):
+        self.put_many([(symbol, tid, cid)])
+
+    def missing(self, symbols):
+        """Return the symbols that are unknown or whose negative entry has expired."""
+        return [s for s in dict.fromkeys(symbols) if self.get(s) is None]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def symbols_from_csv(csv_path):
+    """Read symbols from all_tickers_raw.csv (TikrSymbol/Symbol column) or
+    all_tickers_firstratedata.csv ('SYMBOL (Name) Start Date:...' lines)."""
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        first = f.readline()
+        f.seek(0)
+        if 'Start Date:' in first:
+            pattern = re.compile(r'^([A-Z0-9\.\-\_]+)(?: \(.*?\))? Start Date:')
+            matches = (pattern.match(line) for line in f)
+            return [m.group(1).replace('-DELISTED', '') for m in matches if m]
+        reader = csv.DictReader(f)
+        column = next(c for c in ('TikrSymbol', 'Symbol', 'symbol') if c in reader.fieldnames)
+        return [row[column].strip() for row in reader if row[column].strip()]
+
+
+def symbols_from_db(conn):
+    with conn.cursor() as cur:
+        cur.execute('SELECT symbol FROM companies')
+        return [row[0] for row in cur.fetchall()]
+
+
+def warm_up(index, symbols, resolve_many):
+    """Resolve every symbol the index doesn't know yet with `resolve_many(symbols) -> {symbol: (tid, cid)}`."""
+    todo = index.missing(symbols)
+    print(f'[ . ] {len(todo)} of {len(set(symbols))} symbols need resolving')
+    if todo:
+        resolved = resolve_many(todo)
+        index.put_many((symbol, *resolved[symbol]) for symbol in todo)
+    return len(todo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Warm up the persistent symbol -> (tid, cid) index')
+    parser.add_argument('--csv', action='append', default=[], help='ticker CSV to read symbols from (repeatable)')
+    parser.add_argument('--db', action='store_true', help='also read symbols from the companies table')
+    args = parser.parse_args()
+    if not args.csv and not args.db:
+        args.csv = ['all_tickers_raw.csv', 'all_tickers_firstratedata.csv']
+        args.db = True
+
+    symbols = []
+    for csv_path in args.csv:
+        symbols += symbols_from_csv(csv_path)
+    if args.db:
+        from load_to_postgres import get_conn
+        conn = get_conn()
+        symbols += symbols_from_db(conn)
+        conn.close()
+
+    from tikr_client import TIKR
+    scraper = TIKR()
+    warm_up(scraper.symbols, symbols, scraper.lookup_companies)
+    print('[ . ] Done')
+
+
+if __name__ == '__main__':
+    main()
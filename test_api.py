@@ -16,7 +16,7 @@ def test_screener_manually():
            c.exchange, c.country, c.full_time_employees, 
            f.fiscal_year, f.statement, f.key, f.value 
     FROM companies c 
-    LEFT JOIN financials f ON c.symbol = f.symbol
+    LEFT JOIN financials_named f ON c.symbol = f.symbol
     WHERE c.sector = %s
     LIMIT 10
     """
@@ -0,0 +1,53 @@
+import asyncio
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+# Fetch many companies at once. The TIKR class stays blocking; each company's
+# find_company_info and /prod/fin calls run on a worker thread, with at most
+# `max_in_flight` companies in flight, and results are yielded as they finish.
+
+DEFAULT_MAX_IN_FLIGHT = int(os.getenv('TIKR_MAX_IN_FLIGHT', 4))
+
+
+async def _fetch_company(loop, executor, semaphore, factory, symbol, tid, cid, delay):
+    async with semaphore:
+        scraper = factory()
+        try:
+            if not (tid and cid):
+                tid, cid = await loop.run_in_executor(executor, scraper.find_company_info, symbol)
+                if not (tid and cid):
+                    return symbol, None, None, None
+            await loop.run_in_executor(executor, scraper.getFinancials, tid, cid, symbol)
+        except Exception as err:
+            print(f'[ - ] [Error]: Fetching {symbol} failed: {err}')
+            return symbol, tid, cid, None
+        if delay and not getattr(scraper, 'served_from_cache', False):
+            # Keep each worker's request rate polite towards TIKR
+            await asyncio.sleep(random.uniform(*delay))
+        return symbol, tid, cid, scraper
+
+
+async def stream_financials(companies, factory, max_in_flight=DEFAULT_MAX_IN_FLIGHT, delay=None):
+    """Fetch and parse financials for many companies concurrently.
+
+    `companies` is an iterable of (symbol, tid, cid); a missing tid/cid is
+    resolved with find_company_info first. `factory` builds a fresh TIKR
+    instance per company, so each result holds exactly that company's data.
+    Yields (symbol, tid, cid, scraper) in completion order; scraper is None when
+    the company could not be found or fetched. `delay` is an optional
+    (min, max) pause in seconds a worker takes after each company.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_in_flight)
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        tasks = [
+            asyncio.create_task(_fetch_company(loop, executor, semaphore, factory, symbol, tid, cid, delay))
+            for symbol, tid, cid in companies
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
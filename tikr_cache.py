@@ -0,0 +1,125 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+CACHE_DIR = os.getenv('TIKR_CACHE_DIR', os.path.join('Output', 'cache'))
+CACHE_TTL_DAYS = float(os.getenv('TIKR_CACHE_TTL_DAYS', 30))
+CACHE_MAX_MB = float(os.getenv('TIKR_CACHE_MAX_MB', 2048))
+EVICT_EVERY = 100  # puts between size checks
+
+
+class ResponseCache:
+    """Content-addressed, gzip-compressed on-disk cache of raw /prod/fin responses.
+
+    Entries are keyed by a hash of the request parameters (tid, cid, p, repid,
+    v) and stored as {params, symbol, fetched_at, response} envelopes under
+    <directory>/<2 hex chars>/<hash>.json.gz. Reads older than the TTL miss;
+    when the cache grows past max_bytes the least recently used files are
+    removed until it is back under 90% of the limit.
+    """
+
+    def __init__(self, directory=CACHE_DIR, ttl_days=CACHE_TTL_DAYS, max_mb=CACHE_MAX_MB):
+        self.directory = directory
+        self.ttl = ttl_days * 86400
+        self.max_bytes = max_mb * 1024 * 1024
+        self._puts = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(params):
+        canonical = json.dumps({k: str(params[k]) for k in ('tid', 'cid', 'p', 'repid', 'v')}, sort_keys=True)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def path(self, params):
+        key = self.key(params)
+        return os.path.join(self.directory, key[:2], key + '.json.gz')
+
+    @staticmethod
+    def read(path):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+    def get(self, params, max_age=None):
+        """Return the cached response, or None if missing or older than max_age seconds (default: the TTL)."""
+        path = self.path(params)
+        try:
+            envelope = self.read(path)
+        except (OSError, ValueError):
+            return None
+        if time.time() - envelope['fetched_at'] > (self.ttl if max_age is None else max_age):
+            return None
+        os.utime(path)  # mark as recently used for eviction
+        return envelope['response']
+
+    def put(self, params, response, symbol=None):
+        path = self.path(params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        envelope = {
+            'params': params,
+            'symbol': symbol,
+            'fetched_at': time.time(),
+            'response': response,
+        }
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+            json.dump(envelope, f)
+        os.replace(tmp, path)
+        with self._lock:
+            self._puts += 1
+            check = self._puts % EVICT_EVERY == 0
+        if check:
+            self.evict()
+
+    def files(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.json.gz'):
+                    yield os.path.join(root, name)
+
+    def evict(self):
+        entries = []
+        for path in self.files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes * 0.9:
+                break
+
+    def entries(self):
+        """Yield every cached envelope, regardless of age."""
+        for path in self.files():
+            try:
+                yield self.read(path)
+            except (OSError, ValueError):
+                continue
+
+    def paths_by_symbol(self):
+        """{symbol: [paths]} of every cached envelope; envelopes without a symbol are keyed 'tid-cid'.
+
+        Only the envelopes' params and symbol are kept, so callers can then read
+        and process one company's responses at a time.
+        """
+        groups = {}
+        for path in self.files():
+            try:
+                envelope = self.read(path)
+            except (OSError, ValueError):
+                continue
+            params = envelope['params']
+            symbol = envelope['symbol'] or f"{params['tid']}-{params['cid']}"
+            groups.setdefault(symbol, []).append(path)
+        return groups
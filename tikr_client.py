@@ -0,0 +1,220 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import pandas as pd
+
+import keys
+import symbol_index
+import tikr_cache
+import tikr_http
+import tikr_parser
+import tikr_token
+from config import TIKR_ACCOUNT_USERNAME, TIKR_ACCOUNT_PASSWORD
+
+MAX_TOKEN_REFRESHES = 2
+ALGOLIA_QUERIES_URL = 'https://tjpay1dyt8-3.algolianet.com/1/indexes/*/queries?x-algolia-agent=Algolia%20for%20JavaScript%20(3.35.1)%3B%20Browser%20(lite)&x-algolia-application-id=TJPAY1DYT8&x-algolia-api-key=d88ea2aa3c22293c96736f5ceb5bab4e'
+ALGOLIA_BATCH_SIZE = 500
+# Period types fetched for every company: FY (annual, ending with LTM) and Q (quarterly)
+PERIODS = os.getenv('TIKR_PERIODS', 'FY,Q').split(',')
+
+
+class NoFinancials(LookupError):
+    """A /prod/fin response without data for the requested period."""
+
+
+class TIKR:
+    """TIKR client: resolves tickers to (tid, cid), fetches and caches /prod/fin
+    responses for every period type and parses them into per-statement frames."""
+
+    # Pooled keep-alive sessions for the execute-api and algolia hosts, shared by every instance
+    http = tikr_http.SessionPool()
+    # Raw /prod/fin responses, so exports can be rebuilt without re-hitting TIKR
+    cache = tikr_cache.ResponseCache()
+    # Persistent symbol -> (tid, cid) map, so known tickers skip the Algolia search
+    symbols = symbol_index.SymbolIndex()
+    # token.tmp owner: proactive refresh and one browser login at a time across threads and processes
+    tokens = tikr_token.TokenManager()
+
+    def __init__(self, offline=False, max_cache_age=None, periods=PERIODS):
+        self.offline = offline
+        self.max_cache_age = float('inf') if offline else max_cache_age
+        self.periods = list(periods)
+        self.served_from_cache = False
+        self.cache_hits = {}
+        self.failed_periods = {}
+        self.username = TIKR_ACCOUNT_USERNAME
+        self.password = TIKR_ACCOUNT_PASSWORD
+        self.headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:108.0) Gecko/20100101 Firefox/108.0',
+            'Accept': 'application/json, text/plain, */*',
+            'Accept-Language': 'en-US,en;q=0.5',
+            'Accept-Encoding': 'gzip, deflate, br',
+            'Content-Type': 'application/json',
+            'Origin': 'https://app.tikr.com',
+            'Connection': 'keep-alive',
+            'Referer': 'https://app.tikr.com/',
+            'Sec-Fetch-Dest': 'empty',
+            'Sec-Fetch-Mode': 'cors',
+            'Sec-Fetch-Site': 'cross-site',
+            'Pragma': 'no-cache',
+            'Cache-Control': 'no-cache',
+            'TE': 'trailers'
+        }
+        self.column_names = keys.keys
+        self.statements = keys.statements
+        self.frames = {}
+        self.responses = {}
+        self.ACCESS_TOKEN = self.tokens.current()
+
+    def getAccessToken(self):
+        self.ACCESS_TOKEN = self.tokens.refresh(stale=self.ACCESS_TOKEN)
+
+    def fetchFinancials(self, tid, cid, symbol=None, period='FY', refresh=True):
+        """Return one period type's /prod/fin response, from the cache or TIKR.
+
+        A response without 'dates' is retried with a refreshed token up to
+        MAX_TOKEN_REFRESHES times; with `refresh` off it raises NoFinancials instead.
+        """
+        url = "https://oljizlzlsa.execute-api.us-east-1.amazonaws.com/prod/fin"
+        params = {"tid": tid, "cid": cid, "p": tikr_parser.PERIOD_TYPES[period], "repid": 1, "v": "v1"}
+        cached = self.cache.get(params, max_age=self.max_cache_age)
+        self.cache_hits[period] = cached is not None
+        if cached is not None:
+            return cached
+        if self.offline:
+            raise LookupError(f'No cached financials for tid={tid} cid={cid}')
+        for attempt in range(MAX_TOKEN_REFRESHES + 1):
+            self.ACCESS_TOKEN = self.tokens.get()
+            payload = json.dumps({"auth": self.ACCESS_TOKEN, **params})
+            response = self.http.request("POST", url, headers=self.headers, data=payload).json()
+            if 'dates' in response:
+                self.cache.put(params, response, symbol=symbol)
+                return response
+            if not refresh:
+                raise NoFinancials(f'No {period} financials for tid={tid} cid={cid}')
+            if attempt < MAX_TOKEN_REFRESHES:
+                self.getAccessToken()
+        raise RuntimeError(f'No financials for tid={tid} cid={cid} after {MAX_TOKEN_REFRESHES} token refreshes')
+
+    def parseFinancials(self, response, period='FY'):
+        frames = tikr_parser.build_frames(response, self.statements, period)
+        self.responses[period] = response
+        self.frames[period] = frames
+
+    def records(self):
+        """Yield (statement, fiscal_year, period, key, value) for the company parsed last."""
+        for frames in self.frames.values():
+            yield from tikr_parser.frame_cells(frames)
+
+    def iterFinancials(self, tid, cid, symbol=None):
+        self.getFinancials(tid, cid, symbol)
+        yield from self.records()
+
+    def getFinancials(self, tid, cid, symbol=None):
+        """Fetch and parse every period type of one company.
+
+        A period that fails is logged, recorded in failed_periods and left out,
+        so the others are still stored; RuntimeError is raised only when every
+        period failed. Tokens are only refreshed when no period got data with
+        the current one: a period without data next to one that has it is
+        simply missing, not an expired token.
+        """
+        # Only ever hold one company: a reused instance starts from scratch
+        self.frames, self.responses, self.cache_hits, self.failed_periods = {}, {}, {}, {}
+
+        def fetch(period, refresh):
+            try:
+                return self.fetchFinancials(tid, cid, symbol, period, refresh=refresh)
+            except Exception as err:
+                return err
+
+        # Fetch every period type at once so quarters don't add a second round trip per company
+        with ThreadPoolExecutor(max_workers=len(self.periods)) as pool:
+            results = dict(zip(self.periods, pool.map(lambda period: fetch(period, False), self.periods)))
+            token_ok = any(not isinstance(r, Exception) and not self.cache_hits[p] for p, r in results.items())
+            retry = [] if token_ok else [p for p, r in results.items() if isinstance(r, NoFinancials)]
+            results.update(zip(retry, pool.map(lambda period: fetch(period, True), retry)))
+        for period in self.periods:
+            result = results[period]
+            if not isinstance(result, Exception):
+                try:
+                    self.parseFinancials(result, period)
+                    continue
+                except Exception as err:
+                    result = err
+            self.failed_periods[period] = str(result)
+            print(f'[ - ] [Error]: {period} financials of {symbol or f"tid={tid} cid={cid}"} failed: {result}')
+        if not self.frames:
+            raise RuntimeError(f'No financials for tid={tid} cid={cid}: ' + '; '.join(self.failed_periods.values()))
+        self.served_from_cache = all(self.cache_hits.values())
+
+    def find_company_info(self, ticker):
+        known = self.symbols.get(ticker)
+        if known is not None:
+            return known
+        tid, cid = self.lookup_company(ticker)
+        self.symbols.put(ticker, tid, cid)
+        return tid, cid
+
+    def lookup_company(self, ticker):
+        headers = self.headers.copy()
+        headers['content-type'] = 'application/x-www-form-urlencoded'
+        data = '{"params":"query=' + ticker + '&distinct=2"}'
+        response = self.http.request('POST', 'https://tjpay1dyt8-3.algolianet.com/1/indexes/tikr-feb/query?x-algolia-agent=Algolia%20for%20JavaScript%20(3.35.1)%3B%20Browser%20(lite)&x-algolia-application-id=TJPAY1DYT8&x-algolia-api-key=d88ea2aa3c22293c96736f5ceb5bab4e', headers=headers, data=data)
+        hits = response.json()['hits']
+        if hits:
+            return hits[0]['tradingitemid'], hits[0]['companyid']
+        else:
+            return None, None
+
+    def find_companies(self, tickers):
+        """Resolve many tickers at once: known ones come from the index, the rest
+        are looked up with batched Algolia multi-queries."""
+        missing = self.symbols.missing(tickers)
+        if missing:
+            resolved = self.lookup_companies(missing)
+            self.symbols.put_many((ticker, *resolved[ticker]) for ticker in missing)
+        return {ticker: self.symbols.get(ticker) for ticker in tickers}
+
+    def lookup_companies(self, tickers, batch_size=ALGOLIA_BATCH_SIZE):
+        headers = self.headers.copy()
+        headers['content-type'] = 'application/x-www-form-urlencoded'
+        resolved = {}
+        for start in range(0, len(tickers), batch_size):
+            batch = tickers[start:start + batch_size]
+            data = json.dumps({'requests': [
+                {'indexName': 'tikr-feb', 'params': urlencode({'query': ticker, 'distinct': 2})}
+                for ticker in batch
+            ]})
+            results = self.http.request('POST', ALGOLIA_QUERIES_URL, headers=headers, data=data).json()['results']
+            for ticker, result in zip(batch, results):
+                hits = result['hits']
+                resolved[ticker] = (hits[0]['tradingitemid'], hits[0]['companyid']) if hits else (None, None)
+            print(f'[ . ] Resolved {min(start + batch_size, len(tickers))}/{len(tickers)} symbols')
+        return resolved
+
+    def export(self, filename):
+        with pd.ExcelWriter(filename, engine='xlsxwriter') as writer:
+            for period, frames in self.frames.items():
+                for statement in self.statements:
+                    statement = statement['statement']
+                    if statement not in frames or frames[statement].empty: continue
+                    df = frames[statement].copy()
+                    if period == 'FY':
+                        df.index = [label if label == 'LTM' else year for year, label in df.index]
+                        sheet_name = statement
+                    else:
+                        df.index = [f'{year} {label}' for year, label in df.index]
+                        sheet_name = f'{statement} ({period})'
+                    df.T.to_excel(writer, sheet_name=sheet_name)
+
+                    # FIX SHEET FORMAT
+                    worksheet = writer.sheets[sheet_name]
+                    worksheet.write('A1', filename.split('_')[0])
+                    for idx, col in enumerate(df):
+                        if idx == 0:
+                            worksheet.set_column(idx, idx, 45)
+                        else:
+                            worksheet.set_column(idx, idx, 15)
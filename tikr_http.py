@@ -0,0 +1,69 @@
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CONNECT_TIMEOUT = float(os.getenv('TIKR_CONNECT_TIMEOUT', 5))
+READ_TIMEOUT = float(os.getenv('TIKR_READ_TIMEOUT', 60))
+MAX_RETRIES = int(os.getenv('TIKR_MAX_RETRIES', 5))
+POOL_SIZE = int(os.getenv('TIKR_POOL_SIZE', 10))
+BACKOFF_BASE = 1.0   # seconds
+BACKOFF_MAX = 60.0   # seconds
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def backoff(attempt):
+    """Exponential backoff with full jitter: a random wait in [0, base * 2^attempt]."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+class SessionPool:
+    """One keep-alive requests.Session per host, shared by all threads.
+
+    Requests go through `request`, which sets connect/read timeouts and retries
+    connection errors, timeouts and 429/5xx responses with exponential backoff.
+    """
+
+    def __init__(self, pool_size=POOL_SIZE):
+        self.pool_size = pool_size
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._sessions[host] = session
+            return self._sessions[host]
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', (CONNECT_TIMEOUT, READ_TIMEOUT))
+        session = self.session(url)
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as err:
+                if attempt == MAX_RETRIES:
+                    raise
+                print(f'[ ! ] {urlsplit(url).netloc}: {type(err).__name__}, retrying...')
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                if attempt == MAX_RETRIES:
+                    response.raise_for_status()
+                print(f'[ ! ] {urlsplit(url).netloc}: HTTP {response.status_code}, retrying...')
+            time.sleep(backoff(attempt))
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
@@ -0,0 +1,220 @@
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+ACCESS_DENIED_VALUE = '1.11'
+CASH_FROM_OPERATIONS = 2006
+CAPITAL_EXPENDITURE = 2021
+NEGATED_COLUMNS = ['Income Tax Expense']
+# fiscal_period label -> TIKR's `p` request parameter
+PERIOD_TYPES = {'FY': '1', 'Q': '2'}
+PERIOD_NAMES = {p: name for name, p in PERIOD_TYPES.items()}
+
+
+def build_index(response):
+    """Index a /prod/fin response as {(financialperiodid, dataitemid): dataitemvalue}.
+
+    Only the first row for a given pair is kept, which matches the old
+    `list(filter(...))[0]` lookups.
+    """
+    index = {}
+    for row in response['data']:
+        index.setdefault((row['financialperiodid'], row['dataitemid']), row['dataitemvalue'])
+    return index
+
+
+def decode_statement(index, fiscalyear, statement, revenue_id):
+    """Build one statement's dict for one fiscal year from a response index.
+
+    Returns None when more than 10 of the statement's values are hidden behind
+    TIKR's access-denied placeholder, in which case the year is skipped.
+    """
+    period = fiscalyear['financialperiodid']
+    data = {'year': fiscalyear['calendaryear']}
+    access_denied = 0
+    for column, dataitemid in statement['keys'].items():
+        # SPECIAL CASES
+        if column == 'Free Cash Flow':
+            cash_from_ops = index.get((period, CASH_FROM_OPERATIONS))
+            capital_expen = index.get((period, CAPITAL_EXPENDITURE))
+            if cash_from_ops is not None and capital_expen is not None:
+                data[column] = float(cash_from_ops) + float(capital_expen)
+            continue
+        elif column == '% Free Cash Flow Margins' and 'Free Cash Flow' in data:
+            revenue = index.get((period, revenue_id))
+            if revenue is not None:
+                data[column] = (float(data['Free Cash Flow']) / float(revenue)) * 100
+            continue
+        # GENERAL CASE
+        value = index.get((period, dataitemid))
+        if value is None:
+            data[column] = ''
+        elif value == ACCESS_DENIED_VALUE:
+            access_denied += 1
+            data[column] = ''
+        elif column in NEGATED_COLUMNS:
+            data[column] = float(value) * -1
+        else:
+            data[column] = float(value)
+    if access_denied > 10:
+        return None
+    return data
+
+
+def decode_financials(response, statements):
+    """Decode a whole /prod/fin response into {statement: [year dicts]}."""
+    index = build_index(response)
+    revenue_id = statements[0]['keys']['Revenues']
+    content = {s['statement']: [] for s in statements}
+    for fiscalyear in response['dates']:
+        for statement in statements:
+            data = decode_statement(index, fiscalyear, statement, revenue_id)
+            if data is not None:
+                content[statement['statement']].append(data)
+    return content
+
+
+def pivot_response(response, dataitemids):
+    """Pivot a /prod/fin response into periods x dataitemids matrices.
+
+    Returns (values, denied): the float values (NaN when missing) and a mask of
+    the cells that hold TIKR's access-denied placeholder. Rows follow the order
+    of response['dates'] and columns the order of `dataitemids`.
+    """
+    index = build_index(response)
+    periods = [d['financialperiodid'] for d in response['dates']]
+    cells = pd.Series([index.get((p, i)) for p in periods for i in dataitemids], dtype=object)
+    shape = (len(periods), len(dataitemids))
+    values = pd.to_numeric(cells, errors='coerce').to_numpy(dtype=float).reshape(shape)
+    denied = (cells == ACCESS_DENIED_VALUE).to_numpy().reshape(shape)
+    return values, denied
+
+
+def period_labels(response, period='FY'):
+    """The fiscal_period of every entry in response['dates'].
+
+    Annual responses end with the trailing twelve months, labelled 'LTM'.
+    Quarterly entries are labelled Q1-Q4 from their fiscal (or calendar) quarter,
+    or else from the month of their period end date. Raises ValueError when a
+    quarter cannot be determined or two entries would share a (year, label) key.
+    """
+    dates = response['dates']
+    if period == 'FY':
+        return ['FY'] * (len(dates) - 1) + ['LTM'] if dates else []
+    labels = []
+    for d in dates:
+        quarter = d.get('fiscalquarter') or d.get('calendarquarter')
+        if not quarter and d.get('periodenddate'):
+            quarter = (pd.Timestamp(d['periodenddate']).month - 1) // 3 + 1
+        if not quarter:
+            raise ValueError(f"No quarter for period {d.get('financialperiodid')} of a {period} response")
+        labels.append(f'Q{quarter}')
+    keys = list(zip((d['calendaryear'] for d in dates), labels))
+    if len(set(keys)) != len(keys):
+        duplicates = sorted({k for k in keys if keys.count(k) > 1})
+        raise ValueError(f'Duplicate periods in a {period} response: {duplicates}')
+    return labels
+
+
+def yoy(values, lag=1, ltm=True):
+    """Year over year change of a column, in the `abs(100 - current / previous * 100)` form.
+
+    `lag` is the number of rows per year (4 for quarters). With `ltm` the last
+    row is the LTM period and is left empty, as are rows where either year is
+    missing or zero.
+    """
+    previous = np.concatenate((np.full(min(lag, len(values)), np.nan), values[:-lag]))
+    valid = ~np.isnan(values) & (values != 0) & ~np.isnan(previous) & (previous != 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = np.where(valid, np.round(np.abs(100 - (values / previous) * 100), 2), np.nan)
+    if ltm and len(change):
+        change[-1] = np.nan
+    return change
+
+
+def build_frames(response, statements, period='FY'):
+    """Decode a /prod/fin response into one periods x columns DataFrame per statement.
+
+    The response is pivoted once; each statement then selects its dataitemid
+    columns from the matrix and derives Free Cash Flow, its margin and the YoY
+    columns as whole-column operations. Missing values are NaN. Frames are
+    indexed by (year, fiscal_period); `period` is the response's period type.
+    """
+    needed = {v for s in statements for v in s['keys'].values() if v != ''}
+    needed = sorted(needed | {CASH_FROM_OPERATIONS, CAPITAL_EXPENDITURE})
+    position = {dataitemid: i for i, dataitemid in enumerate(needed)}
+    raw, denied = pivot_response(response, needed)
+    values = np.where(denied, np.nan, raw)
+    years = pd.MultiIndex.from_arrays(
+        [[d['calendaryear'] for d in response['dates']], period_labels(response, period)],
+        names=['year', 'fiscal_period'],
+    )
+    lag, ltm = (1, True) if period == 'FY' else (4, False)
+
+    # Free Cash Flow and its margin ignore the access-denied marker, like the dict decoder
+    free_cash_flow = raw[:, position[CASH_FROM_OPERATIONS]] + raw[:, position[CAPITAL_EXPENDITURE]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fcf_margin = free_cash_flow / raw[:, position[statements[0]['keys']['Revenues']]] * 100
+    fcf_margin[~np.isfinite(fcf_margin)] = np.nan
+
+    frames = {}
+    for statement in statements:
+        columns = list(statement['keys'])
+        mapped = [i for i, c in enumerate(columns) if statement['keys'][c] != '']
+        idx = [position[statement['keys'][columns[i]]] for i in mapped]
+        matrix = np.full((len(years), len(columns)), np.nan)
+        matrix[:, mapped] = values[:, idx]
+        keep = denied[:, idx].sum(axis=1) <= 10
+        for i, column in enumerate(columns):
+            if column in NEGATED_COLUMNS:
+                matrix[:, i] *= -1
+            elif column == 'Free Cash Flow':
+                matrix[:, i] = free_cash_flow
+            elif column == '% Free Cash Flow Margins':
+                matrix[:, i] = fcf_margin
+        matrix = matrix[keep]
+        for i, column in enumerate(columns):
+            if column.endswith(' YoY') and column[:-len(' YoY')] in statement['keys']:
+                matrix[:, i] = yoy(matrix[:, columns.index(column[:-len(' YoY')])], lag, ltm)
+        frames[statement['statement']] = pd.DataFrame(matrix, index=years[keep], columns=columns)
+    return frames
+
+
+def frame_records(frame):
+    """Turn a statement frame back into the legacy list of year dicts ('' for missing)."""
+    records = []
+    for (year, fiscal_period), row in zip(frame.index.tolist(), frame.to_numpy(dtype=object)):
+        data = {'year': year, 'fiscal_period': fiscal_period}
+        data.update({column: ('' if pd.isna(value) else float(value)) for column, value in zip(frame.columns, row)})
+        records.append(data)
+    return records
+
+
+def frame_cells(frames):
+    """Yield (statement, fiscal_year, fiscal_period, key, value) for every cell of {statement: frame}.
+
+    Values are floats, or None where the frame holds NaN.
+    """
+    for statement, frame in frames.items():
+        columns = list(frame.columns)
+        for (year, fiscal_period), row in zip(frame.index.tolist(), frame.to_numpy(dtype=float).tolist()):
+            for key, value in zip(columns, row):
+                yield statement, year, fiscal_period, key, (None if value != value else value)
+
+
+def fingerprint(responses):
+    """Stable hash of a company's {period: response} periods and values, independent of row order."""
+    canonical = []
+    for period in sorted(responses):
+        response = responses[period]
+        rows = sorted((str(r['financialperiodid']), str(r['dataitemid']), str(r['dataitemvalue'])) for r in response['data'])
+        canonical.append([period, response['dates'], rows])
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode()).hexdigest()
+
+
+def latest_period(responses):
+    """The most recent financialperiodid across {period: response}, or None if there are no periods."""
+    periods = [d['financialperiodid'] for response in responses.values() for d in response['dates']]
+    return max(periods) if periods else None
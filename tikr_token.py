@@ -0,0 +1,153 @@
+import base64
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from seleniumwire import webdriver
+from webdriver_manager.firefox import GeckoDriverManager
+from selenium.webdriver.common.by import By
+from selenium.webdriver.firefox.options import Options as FirefoxOptions
+from selenium.webdriver.firefox.service import Service as FirefoxService
+
+from config import TIKR_ACCOUNT_USERNAME, TIKR_ACCOUNT_PASSWORD
+
+TOKEN_PATH = 'token.tmp'
+REFRESH_MARGIN = 300  # seconds before expiry at which the token is refreshed
+LOGIN_TIMEOUT = 120   # seconds
+HEADLESS = os.getenv('TIKR_BROWSER_HEADLESS', '1') != '0'
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:108.0) Gecko/20100101 Firefox/108.0'
+
+
+def token_expiry(token):
+    """Return the `exp` claim of a JWT access token, or None if it can't be decoded."""
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))['exp'])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive lock on `path` shared by every process on this machine."""
+    with open(path, 'a+') as f:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class TokenManager:
+    """Owns the TIKR access token stored in token.tmp.
+
+    get() returns the current token and refreshes it REFRESH_MARGIN seconds
+    before its JWT expiry. refresh() is single-flight: a thread lock and a
+    file lock on token.tmp.lock make sure only one browser login runs at a
+    time across threads and processes; everyone else waiting on the lock
+    picks up the token it wrote.
+    """
+
+    def __init__(self, path=TOKEN_PATH, username=TIKR_ACCOUNT_USERNAME, password=TIKR_ACCOUNT_PASSWORD):
+        self.path = path
+        self.username = username
+        self.password = password
+        self._token = None
+        self._lock = threading.Lock()
+
+    def read(self):
+        if os.path.isfile(self.path):
+            with open(self.path, 'r') as f:
+                return f.read().strip()
+        return ''
+
+    def write(self, token):
+        tmp = f'{self.path}.{os.getpid()}'
+        with open(tmp, 'w') as f:
+            f.write(token)
+        os.replace(tmp, self.path)
+
+    @staticmethod
+    def expiring(token):
+        if not token:
+            return True
+        expiry = token_expiry(token)
+        return expiry is not None and expiry - time.time() < REFRESH_MARGIN
+
+    def current(self):
+        if self._token is None:
+            self._token = self.read()
+        return self._token
+
+    def get(self):
+        token = self.current()
+        if self.expiring(token):
+            token = self.refresh(stale=token)
+        return token
+
+    def refresh(self, stale=None):
+        """Replace `stale` (the token that was rejected or is expiring) with a fresh one."""
+        with self._lock, file_lock(self.path + '.lock'):
+            # Another thread or process may have refreshed while we waited
+            token = self.read()
+            if token and token != stale and not self.expiring(token):
+                self._token = token
+                return token
+            print('[ + ] Generating Access Token...')
+            token = self.login()
+            if token:
+                self.write(token)
+                self._token = token
+            return token
+
+    def login(self):
+        firefox_options = FirefoxOptions()
+        if HEADLESS:
+            firefox_options.add_argument('--headless')
+        firefox_options.set_preference('general.useragent.override', USER_AGENT)
+        firefox_options.add_argument('window-size=1920x1080')
+        s = FirefoxService(GeckoDriverManager().install())
+        browser = webdriver.Firefox(service=s, options=firefox_options, seleniumwire_options={'request_storage': 'memory', 'request_storage_max_size': 10})
+        # Only capture the screener call that carries the token
+        browser.scopes = [r'.*amazonaws\.com/prod/fs.*']
+        try:
+            browser.get('https://app.tikr.com/login')
+            browser.find_element(By.XPATH, '//input[@type="email"]').send_keys(self.username)
+            browser.find_element(By.XPATH, '//input[@type="password"]').send_keys(self.password)
+            browser.find_element(By.XPATH, '//button/span').click()
+            deadline = time.time() + LOGIN_TIMEOUT
+            while 'Welcome to TIKR' not in browser.page_source:
+                if time.time() > deadline:
+                    raise TimeoutError('TIKR login did not complete')
+                time.sleep(5)
+            browser.get('https://app.tikr.com/screener?sid=1')
+            time.sleep(2)
+            browser.find_element(By.XPATH, '//button/span[contains(text(), "Fetch Screen")]/..').click()
+            request = browser.wait_for_request(r'amazonaws\.com/prod/fs', timeout=30)
+            token = json.loads(request.body)['auth']
+            print('[ * ] Successfully fetched access token')
+            return token
+        except Exception as err:
+            print(err)
+            return ''
+        finally:
+            browser.quit()
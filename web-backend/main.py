@@ -1,11 +1,17 @@
 from fastapi import FastAPI, Query, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, conint
 from typing import List, Optional, Any, Dict
+import base64
+import json
 import os
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
 import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
 from collections import defaultdict
 
 # Set up logging
@@ -18,22 +24,137 @@ DB_NAME = os.getenv('DB_NAME', 'stockdb')
 DB_USER = os.getenv('DB_USER', 'postgres')
 DB_PASSWORD = os.getenv('DB_PASSWORD', '')
 
+# Connection pool settings
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))  # seconds to wait for a free connection
+DB_POOL_CHECK_IDLE = float(os.getenv('DB_POOL_CHECK_IDLE', 30))  # ping connections idle longer than this
+DB_POOL_SLOW_WAIT = 0.1  # log checkouts that waited longer than this (seconds)
+
+class ConnectionPool:
+    """Bounded psycopg2 pool: checkouts block up to `timeout` seconds for a free
+    connection, connections idle longer than `check_idle` are pinged before use
+    and replaced if dead, and wait times are recorded for /health/db."""
+
+    def __init__(self, minconn, maxconn, timeout, check_idle, **kwargs):
+        self.pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, **kwargs)
+        self.slots = threading.BoundedSemaphore(maxconn)
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self.last_used = {}
+        self.lock = threading.Lock()
+        self.stats = {'checkouts': 0, 'timeouts': 0, 'replaced': 0, 'in_use': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+
+    def healthy(self, conn):
+        if conn.closed:
+            return False
+        if time.monotonic() - self.last_used.get(id(conn), 0) < self.check_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def checkout(self):
+        conn = self.pool.getconn()
+        try:
+            if not conn.closed and not conn.autocommit:
+                conn.autocommit = True
+        except psycopg2.Error:
+            pass
+        if self.healthy(conn):
+            return conn
+        self.pool.putconn(conn, close=True)
+        with self.lock:
+            self.stats['replaced'] += 1
+        conn = self.pool.getconn()
+        conn.autocommit = True
+        return conn
+
+    def getconn(self):
+        start = time.monotonic()
+        if not self.slots.acquire(timeout=self.timeout):
+            with self.lock:
+                self.stats['timeouts'] += 1
+            raise HTTPException(status_code=503, detail="Database busy, no free connection")
+        try:
+            conn = self.checkout()
+        except Exception:
+            self.slots.release()
+            raise
+        wait = time.monotonic() - start
+        with self.lock:
+            self.stats['checkouts'] += 1
+            self.stats['in_use'] += 1
+            self.stats['wait_total'] += wait
+            self.stats['wait_max'] = max(self.stats['wait_max'], wait)
+        if wait > DB_POOL_SLOW_WAIT:
+            logger.warning(f"Waited {wait * 1000:.0f} ms for a database connection")
+        return conn
+
+    def putconn(self, conn):
+        self.last_used[id(conn)] = time.monotonic()
+        try:
+            self.pool.putconn(conn, close=conn.closed or conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+        finally:
+            with self.lock:
+                self.stats['in_use'] -= 1
+            self.slots.release()
+
+    def closeall(self):
+        self.pool.closeall()
+
+    def status(self):
+        with self.lock:
+            stats = dict(self.stats)
+        checkouts = stats['checkouts'] or 1
+        return {
+            'max_size': self.maxconn,
+            'in_use': stats['in_use'],
+            'checkouts': stats['checkouts'],
+            'timeouts': stats['timeouts'],
+            'replaced': stats['replaced'],
+            'wait_avg_ms': round(stats['wait_total'] / checkouts * 1000, 2),
+            'wait_max_ms': round(stats['wait_max'] * 1000, 2),
+        }
+
+db_pool = None
+
+@contextmanager
 def get_db_connection():
-    """Get a new database connection"""
+    """Check a connection out of the pool for the duration of the with block"""
+    if db_pool is None:
+        raise HTTPException(status_code=503, detail="Database pool not initialised")
+    conn = db_pool.getconn()
+    try:
+        yield conn
+    finally:
+        db_pool.putconn(conn)
+
+@asynccontextmanager
+async def lifespan(app):
+    global db_pool
     try:
-        conn = psycopg2.connect(
+        db_pool = ConnectionPool(
+            DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT, DB_POOL_CHECK_IDLE,
             host=DB_HOST,
             database=DB_NAME,
             user=DB_USER,
             password=DB_PASSWORD
         )
-        conn.autocommit = True
-        return conn
+        logger.info(f"Database pool ready ({DB_POOL_MIN}-{DB_POOL_MAX} connections)")
     except Exception as e:
         logger.error(f"Database connection error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Database connection error: {str(e)}")
+        raise
+    yield
+    db_pool.closeall()
+    db_pool = None
+    logger.info("Database pool closed")
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Allow CORS for frontend
 app.add_middleware(
@@ -44,12 +165,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Columns of the latest_fundamentals snapshot (one row per symbol)
+SNAPSHOT_FIELDS = [
+    'revenue', 'gross_profit', 'operating_income', 'net_income', 'ebitda', 'diluted_eps',
+    'free_cash_flow', 'total_assets', 'total_debt', 'net_debt', 'total_equity',
+    'gross_margin', 'ebitda_margin', 'net_margin', 'return_on_equity', 'debt_to_equity'
+]
+
 # List of fields for screener
 FIELDS = [
     'symbol', 'short_name', 'long_name', 'sector', 'industry', 'market', 'exchange',
-    'country', 'full_time_employees', 'market_cap', 'price_to_book', 'pe_ratio',
-    'dividend_yield', 'revenue', 'net_income', 'total_assets', 'total_debt', 'ebitda',
-    'fiscal_year', 'statement', 'key', 'value'
+    'country', 'full_time_employees', 'revenue', 'net_income', 'total_assets', 'total_debt', 'ebitda',
+    'fiscal_year', 'gross_profit', 'operating_income', 'diluted_eps',
+    'free_cash_flow', 'net_debt', 'total_equity', 'gross_margin', 'ebitda_margin', 'net_margin',
+    'return_on_equity', 'debt_to_equity'
 ]
 
 # Map front-end field names to DB column references
@@ -63,74 +192,281 @@ FIELD_MAP = {
     'exchange': 'c.exchange',
     'country': 'c.country',
     'full_time_employees': 'c.full_time_employees',
-    'fiscal_year': 'f.fiscal_year',
-    'statement': 'f.statement',
-    'key': 'f.key',
-    'value': 'f.value'
+    'fiscal_year': 's.fiscal_year',
+    **{field: f's.{field}' for field in SNAPSHOT_FIELDS}
 }
 
+# Totals above this planner estimate are returned as the estimate instead of counted
+SCREENER_EXACT_COUNT_MAX = int(os.getenv('SCREENER_EXACT_COUNT_MAX', 10000))
+
+# FROM clauses of the screener: every company, companies with a snapshot row,
+# and latest-period financials of one metric (see sort_segments)
+COMPANY_FROM = """
+        FROM companies c
+        LEFT JOIN latest_fundamentals s ON s.symbol = c.symbol
+        """
+SNAPSHOT_FROM = """
+        FROM companies c
+        JOIN latest_fundamentals s ON s.symbol = c.symbol
+        """
+METRIC_FROM = """
+        FROM financials v
+        JOIN latest_fundamentals s ON s.symbol = v.symbol AND s.fiscal_year = v.fiscal_year AND s.fiscal_period = v.fiscal_period
+        JOIN companies c ON c.symbol = v.symbol
+        """
+
+SORT_DIRECTIONS = {'asc': 'ASC', 'desc': 'DESC'}
+
+# Filter operators accepted from the client, mapped to SQL
+OPERATORS = {'=': '=', '!=': '<>', '<>': '<>', '>': '>', '<': '<', '>=': '>=', '<=': '<=', 'like': 'LIKE'}
+
 class ScreenerFilter(BaseModel):
-    field: str
+    field: str  # a FIELDS entry or any financial metric key, e.g. 'Total Revenues' (see /metrics)
     op: str  # '=', '>', '<', '>=', '<=', 'like', etc.
     value: Any
+    statement: Optional[str] = None  # picks the statement when a metric key exists in several
 
 class ScreenerRequest(BaseModel):
     filters: List[ScreenerFilter]
-    limit: Optional[int] = 100
-    offset: Optional[int] = 0
+    limit: conint(ge=1, le=1000) = 100
+    offset: conint(ge=0) = 0
+    after: Optional[str] = None  # 'next' token of the previous page, replaces offset
+    sort: Optional[str] = 'symbol'  # a FIELDS entry or a financial metric key; rows without a value come last
+    order: Optional[str] = 'asc'  # 'asc' or 'desc'
+    sort_statement: Optional[str] = None  # picks the statement when the sort key exists in several
+    include_total: Optional[bool] = False
     columns: Optional[List[str]] = None
 
 @app.get("/fields")
 def get_fields():
     return {"fields": FIELDS}
 
+@app.get("/metrics")
+def get_metrics():
+    """Financial metric keys that can be used as screener filter fields"""
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT s.name, m.key FROM metrics m JOIN statements s ON s.id = m.statement_id ORDER BY s.name, m.id")
+        return {"metrics": [{"statement": statement, "key": key} for statement, key in cur.fetchall()]}
+
+@app.get("/health/db")
+def db_health():
+    """Pool usage and connection wait times, for sizing DB_POOL_MAX"""
+    if db_pool is None:
+        raise HTTPException(status_code=503, detail="Database pool not initialised")
+    return db_pool.status()
+
+def load_metrics(cur, keys):
+    """{key: {statement: (statement_id, metric_id)}} for the given metric keys"""
+    metrics = defaultdict(dict)
+    if keys:
+        cur.execute("""
+        SELECT m.key, s.name, m.statement_id, m.id
+        FROM metrics m JOIN statements s ON s.id = m.statement_id
+        WHERE m.key = ANY(%s)
+        """, (list(keys),))
+        for key, statement, statement_id, metric_id in cur.fetchall():
+            metrics[key][statement] = (statement_id, metric_id)
+    return metrics
+
+def pick_metric(metrics, key, statement=None):
+    candidates = {name: ids for name, ids in metrics[key].items() if statement in (None, name)}
+    if not candidates:
+        raise HTTPException(status_code=400, detail=f"Unknown field: {key}")
+    if len(candidates) > 1:
+        raise HTTPException(status_code=400, detail=f"'{key}' exists in {', '.join(sorted(candidates))}, set 'statement'")
+    return next(iter(candidates.values()))
+
+def compile_filters(cur, filters):
+    """Turn screener filters into WHERE clauses and their params.
+
+    FIELD_MAP fields filter companies (c.) and latest_fundamentals (s.)
+    directly. Any other field is a financial metric key, matched on the
+    symbol's latest period (the one latest_fundamentals points at) through an
+    EXISTS the planner can drive either way: from idx_financials_metric_value
+    for selective conditions, or by probing uq_financials_cell per company.
+    """
+    metrics = load_metrics(cur, [f.field for f in filters if f.field not in FIELD_MAP])
+    
+    where_clauses = []
+    params = []
+    for f in filters:
+        op = OPERATORS.get(f.op.lower())
+        if op is None:
+            raise HTTPException(status_code=400, detail=f"Unsupported operator: {f.op}")
+        
+        if f.field in FIELD_MAP:
+            field_reference = FIELD_MAP[f.field]
+            if op == 'LIKE':
+                where_clauses.append(f"{field_reference} LIKE %s")
+                params.append(f"%{f.value}%")
+            else:
+                where_clauses.append(f"{field_reference} {op} %s")
+                params.append(f.value)
+            continue
+        
+        statement_id, metric_id = pick_metric(metrics, f.field, f.statement)
+        if op == 'LIKE':
+            raise HTTPException(status_code=400, detail=f"Metric filters are numeric, 'like' is not supported for {f.field}")
+        where_clauses.append(f"""EXISTS (
+            SELECT 1 FROM financials f
+            WHERE f.symbol = s.symbol AND f.statement_id = %s AND f.fiscal_year = s.fiscal_year
+            AND f.fiscal_period = s.fiscal_period AND f.fiscal_period IN ('FY', 'LTM')
+            AND f.metric_id = %s AND f.value {op} %s
+        )""")
+        params.extend([statement_id, metric_id, f.value])
+    return where_clauses, params
+
+def sort_segments(cur, field, statement=None):
+    """How to read screener rows ordered by `field`.
+
+    Returns (value, symbol, from_clause, where, params, null_where,
+    null_params): rows that have a value are read from `from_clause` ordered
+    by (value, symbol), which an index can serve; null_where picks the rows
+    without one, which come last in symbol order (None when there are none).
+    """
+    if field in FIELD_MAP:
+        reference = FIELD_MAP[field]
+        if reference == 'c.symbol':
+            return reference, 'c.symbol', COMPANY_FROM, [], [], None, []
+        if reference.startswith('s.'):
+            # idx_latest_fundamentals_<field> serves the top-K
+            return reference, 's.symbol', SNAPSHOT_FROM, [f"{reference} IS NOT NULL"], [], f"{reference} IS NULL", []
+        return reference, 'c.symbol', COMPANY_FROM, [f"{reference} IS NOT NULL"], [], f"{reference} IS NULL", []
+    
+    # Any other metric: walk idx_financials_metric_value for rows of the symbols' latest period
+    statement_id, metric_id = pick_metric(load_metrics(cur, [field]), field, statement)
+    where = ["v.statement_id = %s", "v.metric_id = %s", "v.fiscal_period IN ('FY', 'LTM')", "v.value IS NOT NULL"]
+    null_where = """NOT EXISTS (
+            SELECT 1 FROM financials v
+            WHERE v.symbol = s.symbol AND v.statement_id = %s AND v.fiscal_year = s.fiscal_year
+            AND v.fiscal_period = s.fiscal_period AND v.metric_id = %s AND v.value IS NOT NULL
+        )"""
+    return 'v.value', 'v.symbol', METRIC_FROM, where, [statement_id, metric_id], null_where, [statement_id, metric_id]
+
+def encode_cursor(values):
+    """Opaque keyset pagination token for the sort key values of a page's last row"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(token):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (ValueError, TypeError):
+        values = None
+    if not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Invalid 'after' token")
+    return values
+
+def count_matches(cur, from_where, params):
+    """(total, estimated): exact count(*) when the planner expects at most
+    SCREENER_EXACT_COUNT_MAX rows, otherwise the planner's row estimate"""
+    cur.execute("EXPLAIN (FORMAT JSON) SELECT 1 " + from_where, params)
+    estimate = int(cur.fetchone()[0][0]['Plan']['Plan Rows'])
+    if estimate > SCREENER_EXACT_COUNT_MAX:
+        return estimate, True
+    cur.execute("SELECT count(*) " + from_where, params)
+    return cur.fetchone()[0], False
+
 @app.post("/screener")
 def screener(req: ScreenerRequest):
     try:
-        # First, get matching companies to avoid duplicates from the financials join
-        company_query = """
+        # First, get matching companies to avoid duplicates from the financials join;
+        # latest_fundamentals holds at most one row per symbol
+        company_query = f"""
         SELECT c.symbol, c.short_name, c.long_name, c.sector, c.industry, 
-               c.market, c.exchange, c.country, c.full_time_employees 
-        FROM companies c
+               c.market, c.exchange, c.country, c.full_time_employees,
+               {', '.join('s.' + field for field in SNAPSHOT_FIELDS)}
         """
         
-        where_clauses = []
-        params = []
+        direction = SORT_DIRECTIONS.get((req.order or 'asc').lower())
+        if direction is None:
+            raise HTTPException(status_code=400, detail=f"Unsupported order: {req.order}")
+        comparison = '>' if direction == 'ASC' else '<'
         
-        for f in req.filters:
-            # Only use company filters (starting with 'c.')
-            if f.field in FIELD_MAP and FIELD_MAP[f.field].startswith('c.'):
-                field_reference = FIELD_MAP.get(f.field, f.field)
+        with get_db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+            where_clauses, params = compile_filters(cur, req.filters)
+            
+            total = estimated = None
+            if req.include_total:
+                total, estimated = count_matches(cur, COMPANY_FROM + (" WHERE " + " AND ".join(where_clauses) if where_clauses else ""), params)
+            
+            value, symbol, from_clause, value_where, value_params, null_where, null_params = sort_segments(cur, req.sort or 'symbol', req.sort_statement)
+            
+            # Keyset pagination: the token holds the previous page's last (sort value, symbol),
+            # so a page continues from there instead of scanning and discarding `offset` rows
+            after = None
+            offset = req.offset
+            if req.after is not None:
+                after = decode_cursor(req.after)
+                if len(after) != 2:
+                    raise HTTPException(status_code=400, detail="Invalid 'after' token")
+                offset = 0
+            
+            # Rows with a sort value first, one index-ordered query; one extra row tells whether there is a next page
+            companies = []
+            if after is None or after[0] is not None:
+                clauses, segment_params = where_clauses + value_where, params + value_params
+                if after is not None:
+                    clauses.append(f"({value}, {symbol}) {comparison} (%s, %s)")
+                    segment_params += after
+                segment_from = from_clause + (" WHERE " + " AND ".join(clauses) if clauses else "")
                 
-                if f.op.lower() == 'like':
-                    where_clauses.append(f"{field_reference} LIKE %s")
-                    params.append(f"%{f.value}%")
+                query = company_query + f", {value} AS sort_value" + segment_from + f" ORDER BY {value} {direction}, {symbol} {direction} LIMIT %s OFFSET %s"
+                logger.info(f"Company query: {query}")
+                logger.info(f"With params: {segment_params}")
+                cur.execute(query, segment_params + [req.limit + 1, offset])
+                companies = [dict(row) for row in cur.fetchall()]
+                if offset and not companies:
+                    # The offset lies past this segment, skip what it holds
+                    cur.execute("SELECT count(*) " + segment_from, segment_params)
+                    offset -= cur.fetchone()[0]
                 else:
-                    where_clauses.append(f"{field_reference} {f.op} %s")
-                    params.append(f.value)
-        
-        if where_clauses:
-            company_query += " WHERE " + " AND ".join(where_clauses)
-        
-        company_query += " ORDER BY c.symbol LIMIT %s OFFSET %s"
-        params.append(req.limit)
-        params.append(req.offset)
-        
-        logger.info(f"Company query: {company_query}")
-        logger.info(f"With params: {params}")
-        
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        
-        # Execute company query
-        cur.execute(company_query, params)
-        companies = [dict(row) for row in cur.fetchall()]
+                    offset = 0
+            
+            # Then the rows without a value, in symbol order
+            if null_where is not None and len(companies) <= req.limit:
+                clauses, segment_params = where_clauses + [null_where], params + null_params
+                if after is not None and after[0] is None:
+                    clauses.append("c.symbol > %s")
+                    segment_params.append(after[1])
+                query = company_query + ", NULL AS sort_value" + COMPANY_FROM + " WHERE " + " AND ".join(clauses) + " ORDER BY c.symbol LIMIT %s OFFSET %s"
+                logger.info(f"Company query: {query}")
+                logger.info(f"With params: {segment_params}")
+                cur.execute(query, segment_params + [req.limit + 1 - len(companies), offset])
+                companies += [dict(row) for row in cur.fetchall()]
+            
+            next_token = None
+            if len(companies) > req.limit:
+                last = companies[req.limit - 1]
+                next_token = encode_cursor([last['sort_value'], last['symbol']])
+            companies = companies[:req.limit]
+            
+            # Latest annual/LTM financials of the whole page in one query: the
+            # LATERAL subquery probes idx_financials_symbol_year once per symbol
+            cur.execute("""
+            SELECT page.symbol, s.name AS statement, m.key, f.value
+            FROM unnest(%s::text[]) AS page(symbol)
+            CROSS JOIN LATERAL (
+                SELECT statement_id, metric_id, fiscal_period, value
+                FROM financials
+                WHERE symbol = page.symbol AND fiscal_period IN ('FY', 'LTM')
+                AND fiscal_year = (
+                    SELECT MAX(fiscal_year) FROM financials
+                    WHERE symbol = page.symbol AND fiscal_period IN ('FY', 'LTM')
+                )
+            ) f
+            JOIN statements s ON s.id = f.statement_id
+            JOIN metrics m ON m.id = f.metric_id
+            ORDER BY f.fiscal_period = 'LTM'
+            """, ([company['symbol'] for company in companies],))
+            
+            # Organize financial data by symbol, statement type and key (LTM rows sort last and win)
+            latest_financials = defaultdict(lambda: defaultdict(dict))
+            for fin in cur.fetchall():
+                latest_financials[fin['symbol']][fin['statement']][fin['key']] = fin['value']
         
-        # For each company, get the most recent financial data (optional)
         results = []
         for company in companies:
-            # Add the company info to results
-            company_data = {
+            results.append({
                 'symbol': company['symbol'],
                 'short_name': company['short_name'],
                 'long_name': company['long_name'],
@@ -140,33 +476,16 @@ def screener(req: ScreenerRequest):
                 'exchange': company['exchange'],
                 'country': company['country'],
                 'full_time_employees': company['full_time_employees'],
-                'latest_financials': {}
-            }
-            
-            # Get latest financial data for key metrics
-            financial_query = """
-            SELECT f.fiscal_year, f.statement, f.key, f.value 
-            FROM financials f 
-            WHERE f.symbol = %s
-            AND f.fiscal_year = (SELECT MAX(fiscal_year) FROM financials WHERE symbol = %s)
-            """
-            
-            cur.execute(financial_query, (company['symbol'], company['symbol']))
-            financials = cur.fetchall()
-            
-            # Organize financial data by statement type and key
-            for fin in financials:
-                if fin['statement'] not in company_data['latest_financials']:
-                    company_data['latest_financials'][fin['statement']] = {}
-                
-                company_data['latest_financials'][fin['statement']][fin['key']] = fin['value']
-            
-            results.append(company_data)
+                **{field: company[field] for field in SNAPSHOT_FIELDS},
+                'latest_financials': {statement: dict(entries) for statement, entries in latest_financials[company['symbol']].items()}
+            })
         
-        cur.close()
-        conn.close()
-        
-        return {"results": results}
+        response = {"results": results, "next": next_token}
+        if req.include_total:
+            response.update({"total": total, "total_estimated": estimated})
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in screener endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -174,52 +493,47 @@ def screener(req: ScreenerRequest):
 @app.get("/company/{symbol}")
 def get_company(symbol: str):
     try:
-        conn = get_db_connection()
-        
-        # Get company details
-        cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        cur.execute("SELECT * FROM companies WHERE symbol = %s", (symbol,))
-        company = cur.fetchone()
+        with get_db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+            # Get company details
+            cur.execute("SELECT * FROM companies WHERE symbol = %s", (symbol,))
+            company = cur.fetchone()
         
-        if not company:
-            cur.close()
-            conn.close()
-            raise HTTPException(status_code=404, detail="Company not found")
+            if not company:
+                raise HTTPException(status_code=404, detail="Company not found")
         
-        # Get company financials - grouped by fiscal year and statement type
-        cur.execute("""
-        SELECT fiscal_year, statement, key, value 
-        FROM financials 
-        WHERE symbol = %s
-        ORDER BY fiscal_year DESC, statement
-        """, (symbol,))
+            # Get company financials - grouped by fiscal year and statement type (annual and LTM rows only)
+            cur.execute("""
+            SELECT fiscal_year, statement, key, value 
+            FROM financials_named 
+            WHERE symbol = %s AND fiscal_period IN ('FY', 'LTM')
+            ORDER BY fiscal_year DESC, statement, fiscal_period = 'LTM'  -- LTM overwrites FY of the same year
+            """, (symbol,))
         
-        all_financials = cur.fetchall()
+            all_financials = cur.fetchall()
         
-        # Organize financials by year and statement type
-        organized_financials = defaultdict(lambda: defaultdict(dict))
-        for fin in all_financials:
-            organized_financials[fin['fiscal_year']][fin['statement']][fin['key']] = fin['value']
+            # Organize financials by year and statement type
+            organized_financials = defaultdict(lambda: defaultdict(dict))
+            for fin in all_financials:
+                organized_financials[fin['fiscal_year']][fin['statement']][fin['key']] = fin['value']
         
-        # Convert to a more frontend-friendly format
-        financials_list = []
-        for year, statements in organized_financials.items():
-            for statement_type, entries in statements.items():
-                financials_list.append({
-                    'fiscal_year': year,
-                    'statement': statement_type,
-                    'data': entries
-                })
+            # Convert to a more frontend-friendly format
+            financials_list = []
+            for year, statements in organized_financials.items():
+                for statement_type, entries in statements.items():
+                    financials_list.append({
+                        'fiscal_year': year,
+                        'statement': statement_type,
+                        'data': entries
+                    })
         
         company_dict = dict(company)
         
-        cur.close()
-        conn.close()
-        
         return {
             "company": company_dict,
             "financials": financials_list
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in get_company endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}") 
\ No newline at end of file